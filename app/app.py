@@ -7,8 +7,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import pages
 from pages.home import show_home_page
-from pages.timeline import show_timeline_page
+from pages.timeline import show_timeline_page, reset_timeline_pages
 from pages.insights import show_insights_page
+from app.utils.firebase import partition_id, set_current_user
 
 # Configure the app
 st.set_page_config(
@@ -35,6 +36,16 @@ def main():
     st.sidebar.title("Digital Time Capsule")
     st.sidebar.subheader("AI Memory Keeper")
     
+    # Each name has its own separate set of entries
+    user_id = partition_id(st.sidebar.text_input(
+        "Your name",
+        help="Entries are stored separately for each name. Leave empty to use the shared journal."
+    ))
+    if st.session_state.get('user_id') != user_id:
+        reset_timeline_pages()
+        st.session_state['user_id'] = user_id
+    set_current_user(user_id)
+    
     # Navigation options
     pages = {
         "New Entry": show_home_page,
@@ -0,0 +1,131 @@
+import os
+import sys
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Add path to ensure imports work correctly
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.summarizer import summarize_text, analyze_sentiment, extract_keywords
+from app.utils.firebase import get_manager
+
+logger = logging.getLogger(__name__)
+
+# Threads running the analyses of saved entries
+ENRICHMENT_WORKERS = int(os.environ.get('TIME_CAPSULE_NLP_WORKERS', '3'))
+
+# Entry field filled in by each analysis
+ANALYSES = {
+    'summary': lambda content: summarize_text(content, max_length=100, min_length=20),
+    'sentiment': analyze_sentiment,
+    'keywords': extract_keywords,
+}
+
+_executor = ThreadPoolExecutor(max_workers=ENRICHMENT_WORKERS, thread_name_prefix='nlp-enrichment')
+_jobs = {}
+_jobs_lock = threading.Lock()
+_resumed = set()
+
+
+class EnrichmentJob:
+    """The analyses of one saved entry, running concurrently in the background.
+
+    Each result is written to the entry with update_entry() as soon as it
+    is ready; the last one also sets `analysis_status` to "complete" (or
+    "failed" if an analysis raised).
+    """
+
+    def __init__(self, entry_id, manager):
+        self.entry_id = entry_id
+        self.manager = manager
+        self._lock = threading.Lock()
+        self._remaining = len(ANALYSES)
+        self._failed = False
+        self.futures = {}
+
+    def start(self, content):
+        for field, analyze in ANALYSES.items():
+            future = _executor.submit(analyze, content)
+            self.futures[field] = future
+            future.add_done_callback(lambda future, field=field: self._write_back(field, future))
+
+    def _write_back(self, field, future):
+        data = {}
+        try:
+            data[field] = future.result()
+        except Exception as e:
+            logger.error(f"Error analyzing entry {self.entry_id} ({field}): {e}")
+        # Writes for one entry are applied one at a time
+        with self._lock:
+            self._remaining -= 1
+            self._failed = self._failed or field not in data
+            if not self._remaining:
+                data['analysis_status'] = 'failed' if self._failed else 'complete'
+            try:
+                if data:
+                    self.manager.update_entry(self.entry_id, data)
+            except Exception as e:
+                logger.error(f"Error saving analysis of entry {self.entry_id}: {e}")
+            if not self._remaining:
+                with _jobs_lock:
+                    _jobs.pop(self.entry_id, None)
+
+    def progress(self):
+        """Fraction of the analyses that have finished"""
+        return sum(future.done() for future in self.futures.values()) / len(self.futures)
+
+    def as_completed(self, timeout=None):
+        """Yield (field, result) as each analysis finishes (result is None if it failed)"""
+        fields = {future: field for field, future in self.futures.items()}
+        for future in as_completed(fields, timeout):
+            yield fields[future], future.result() if future.exception() is None else None
+
+
+def enrich_entry(entry_id, content, manager=None):
+    """Start analyzing a saved entry in the background and return its job
+
+    The entry should have been saved with `analysis_status: "pending"`.
+    """
+    manager = manager or get_manager()
+    with _jobs_lock:
+        job = _jobs.get(entry_id)
+        if job is not None:
+            return job
+        job = _jobs[entry_id] = EnrichmentJob(entry_id, manager)
+    # Started outside the lock: an analysis that finishes at once removes the job
+    job.start(content)
+    return job
+
+
+def get_job(entry_id):
+    """The running job of an entry, or None"""
+    with _jobs_lock:
+        return _jobs.get(entry_id)
+
+
+def resume_pending(manager=None):
+    """Restart, in the background, the analyses of entries left pending by a restart
+
+    Runs once per user partition and process.
+    """
+    manager = manager or get_manager()
+    with _jobs_lock:
+        if manager.user_id in _resumed:
+            return
+        _resumed.add(manager.user_id)
+    threading.Thread(target=_resume, args=(manager,), name='nlp-enrichment-resume', daemon=True).start()
+
+
+def _resume(manager):
+    try:
+        # Pending entries written to Firestore are not in local storage
+        manager.wait_ready()
+        # Only the pending entries are read, filtered by the store
+        entries = manager.get_entries(limit=None, order_by=None, filters={'analysis_status': 'pending'},
+                                      fields=['content'])
+        for entry in entries:
+            if get_job(entry['id']) is None:
+                enrich_entry(entry['id'], entry.get('content') or '', manager)
+    except Exception as e:
+        logger.error(f"Error resuming pending analyses: {e}")
@@ -0,0 +1,150 @@
+import gc
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def model_size_mb(model):
+    """Memory held by a model's weights in MB, or None if it cannot be measured
+
+    Works for torch modules and for pipelines (through their `model`), and
+    counts the packed int8 weights of dynamically quantized layers.
+    """
+    module = getattr(model, 'model', model)
+    try:
+        state = module.state_dict()
+    except Exception:
+        return None
+    seen = set()
+    total = 0
+    values = list(state.values())
+    while values:
+        value = values.pop()
+        if isinstance(value, (tuple, list)):
+            values.extend(value)
+        elif hasattr(value, 'element_size'):
+            # Tied weights share storage and are only counted once
+            key = value.data_ptr()
+            if key not in seen:
+                seen.add(key)
+                total += value.numel() * value.element_size()
+    return total / 2**20
+
+
+class ModelRegistry:
+    """Loads models on first use and keeps them within a memory budget.
+
+    Each model is registered with a loader and an estimated size. get()
+    loads a model the first time it is needed, unloading the least recently
+    used models if it would not fit in `memory_budget_mb`; a model larger
+    than the whole budget is still loaded, on its own. Models not used for
+    `idle_timeout` seconds are unloaded by a background thread, so an idle
+    worker's memory goes back down. A model whose loader fails is not tried
+    again and get() returns None for it.
+    """
+
+    def __init__(self, memory_budget_mb=2048, idle_timeout=600):
+        self.memory_budget_mb = memory_budget_mb
+        self.idle_timeout = idle_timeout
+
+        self._lock = threading.Lock()
+        self._loaders = {}
+        self._estimates = {}
+        # name -> [model, size in MB, last used]; least recently used first
+        self._loaded = OrderedDict()
+        self._failed = set()
+        self._load_locks = {}
+        self._reaper = None
+
+    def register(self, name, loader, size_mb):
+        """Register `loader()` as the way to load model `name` (about size_mb MB)"""
+        with self._lock:
+            self._loaders[name] = loader
+            self._estimates[name] = size_mb
+            self._load_locks[name] = threading.Lock()
+
+    def get(self, name):
+        """Return model `name`, loading it if needed (None if it cannot be loaded)"""
+        with self._lock:
+            model = self._touch(name)
+            if model is not None or name in self._failed:
+                return model
+            load_lock = self._load_locks[name]
+
+        # Loading can take seconds; only callers of this model wait for it
+        with load_lock:
+            with self._lock:
+                model = self._touch(name)
+                if model is not None or name in self._failed:
+                    return model
+                evicted = self._make_room(self._estimates[name])
+            if evicted:
+                # Free the evicted weights before allocating new ones
+                gc.collect()
+            try:
+                model = self._loaders[name]()
+            except Exception as e:
+                logger.error(f"Error loading model {name}: {e}")
+                with self._lock:
+                    self._failed.add(name)
+                return None
+
+            size = model_size_mb(model) or self._estimates[name]
+            with self._lock:
+                self._make_room(size)
+                self._loaded[name] = [model, size, time.monotonic()]
+                self._start_reaper()
+            logger.info(f"Loaded model {name} ({size:.0f} MB)")
+            return model
+
+    def _touch(self, name):
+        slot = self._loaded.get(name)
+        if slot is None:
+            return None
+        slot[2] = time.monotonic()
+        self._loaded.move_to_end(name)
+        return slot[0]
+
+    def _make_room(self, size_mb):
+        """Unload least recently used models until size_mb more would fit"""
+        evicted = []
+        while self._loaded and self.loaded_mb() + size_mb > self.memory_budget_mb:
+            name, _ = self._loaded.popitem(last=False)
+            evicted.append(name)
+            logger.info(f"Unloaded model {name} to stay within the memory budget")
+        return evicted
+
+    def loaded_mb(self):
+        return sum(slot[1] for slot in self._loaded.values())
+
+    def unload(self, name):
+        with self._lock:
+            slot = self._loaded.pop(name, None)
+        if slot is not None:
+            gc.collect()
+
+    def loaded(self):
+        """Names of the models currently in memory"""
+        with self._lock:
+            return list(self._loaded)
+
+    def _start_reaper(self):
+        if self._reaper is None and self.idle_timeout:
+            self._reaper = threading.Thread(target=self._reap, name='model-reaper', daemon=True)
+            self._reaper.start()
+
+    def _reap(self):
+        while True:
+            time.sleep(max(1.0, self.idle_timeout / 4))
+            cutoff = time.monotonic() - self.idle_timeout
+            with self._lock:
+                idle = [name for name, slot in self._loaded.items() if slot[2] < cutoff]
+                for name in idle:
+                    del self._loaded[name]
+            for name in idle:
+                logger.info(f"Unloaded model {name} after {self.idle_timeout:.0f}s idle")
+            if idle:
+                gc.collect()
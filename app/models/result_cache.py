@@ -0,0 +1,124 @@
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_last_used ON results(last_used);
+"""
+
+
+def normalize_text(text):
+    """Text with Unicode and whitespace differences removed"""
+    return ' '.join(unicodedata.normalize('NFC', str(text)).split())
+
+
+def result_key(kind, text, model, **params):
+    """Cache key of an analysis: the kind, normalized text, model id and parameters"""
+    payload = json.dumps([kind, model, sorted(params.items()), normalize_text(text)])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """Cache of NLP results keyed by result_key().
+
+    Recently used results are kept in an in-memory LRU of `memory_items`
+    entries. With a path, every result is also stored in a SQLite file so it
+    survives restarts; once the stored values exceed `max_disk_mb`, the
+    least recently used ones are deleted.
+    """
+
+    def __init__(self, path=None, memory_items=512, max_disk_mb=64):
+        self.path = path
+        self.memory_items = memory_items
+        self.max_disk_bytes = int(max_disk_mb * 2**20)
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._conn = None
+        self._disk_bytes = 0
+        if path:
+            try:
+                self._conn = sqlite3.connect(path, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+                self._conn.executescript(SCHEMA)
+                self._disk_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            except Exception as e:
+                logger.error(f"Error opening NLP result cache, keeping results in memory only: {e}")
+                self._conn = None
+
+    def _remember(self, key, data):
+        # Stored serialized so callers can never modify a cached result
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached result for a key, or None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return json.loads(self._memory[key])
+            if self._conn is None:
+                return None
+            try:
+                row = self._conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                with self._conn:
+                    self._conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+            except Exception as e:
+                logger.error(f"Error reading NLP result cache: {e}")
+                return None
+            self._remember(key, row[0])
+            return json.loads(row[0])
+
+    def put(self, key, value):
+        """Cache a JSON-serializable result"""
+        data = json.dumps(value)
+        with self._lock:
+            self._remember(key, data)
+            if self._conn is None:
+                return
+            try:
+                with self._conn:
+                    old = self._conn.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO results (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                        (key, data, len(data), time.time()))
+                    self._disk_bytes += len(data) - (old[0] if old else 0)
+                    if self._disk_bytes > self.max_disk_bytes:
+                        self._evict()
+            except Exception as e:
+                logger.error(f"Error writing NLP result cache: {e}")
+
+    def _evict(self):
+        """Delete least recently used results until the file is back to 90% of its limit"""
+        target = self.max_disk_bytes * 0.9
+        freed = []
+        for key, size in self._conn.execute("SELECT key, size FROM results ORDER BY last_used"):
+            if self._disk_bytes <= target:
+                break
+            freed.append((key,))
+            self._disk_bytes -= size
+        self._conn.executemany("DELETE FROM results WHERE key = ?", freed)
+
+    def __len__(self):
+        with self._lock:
+            if self._conn is None:
+                return len(self._memory)
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
@@ -1,8 +1,6 @@
-from transformers import pipeline, AutoModelForSequenceClassification, AutoTokenizer
-import torch
 import numpy as np
 from sklearn.cluster import KMeans
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
 from textblob import TextBlob
 import nltk
 from nltk.tokenize import sent_tokenize
@@ -17,72 +15,275 @@ logger = logging.getLogger(__name__)
 # Add path to ensure imports work correctly
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from app.models.registry import ModelRegistry
+from app.models.result_cache import ResultCache, result_key
+
+SUMMARIZER_MODEL = "facebook/bart-large-cnn"
+SENTIMENT_MODEL = "distilbert-base-uncased-finetuned-sst-2-english"
+
+# Models are loaded on first use. Together they may use at most this much
+# memory (least recently used models are unloaded to make room), and a model
+# that has not been used for MODEL_IDLE_SECONDS is unloaded.
+MODEL_MEMORY_BUDGET_MB = int(os.environ.get('TIME_CAPSULE_MODEL_MEMORY_MB', '2048'))
+MODEL_IDLE_SECONDS = int(os.environ.get('TIME_CAPSULE_MODEL_IDLE_SECONDS', '600'))
+
+# Quantize the linear layers of both models to int8 on CPU-only hosts, which
+# roughly halves their memory and speeds up inference ("1" to enable)
+QUANTIZE_MODELS = os.environ.get('TIME_CAPSULE_QUANTIZE_MODELS', '0') == '1'
+
+# Texts run through a model together by the *_batch methods
+NLP_BATCH_SIZE = int(os.environ.get('TIME_CAPSULE_NLP_BATCH_SIZE', '8'))
+
+# Sentences of long texts are classified in batches of at most this many
+# padded tokens, so a very long entry does not become one huge batch.
+# Sentences longer than the classifier's input are truncated to SENTIMENT_MAX_TOKENS.
+SENTIMENT_BATCH_TOKENS = int(os.environ.get('TIME_CAPSULE_SENTIMENT_BATCH_TOKENS', '4096'))
+SENTIMENT_MAX_TOKENS = 512
+
+# Results are cached by content hash, in memory and in this SQLite file
+# (limited to NLP_CACHE_MB; set the file to "" to keep results in memory only)
+NLP_CACHE_FILE = os.environ.get('TIME_CAPSULE_NLP_CACHE_FILE', 'nlp_cache.db')
+NLP_CACHE_MB = float(os.environ.get('TIME_CAPSULE_NLP_CACHE_MB', '64'))
+
+# Bump a version whenever the way that result is computed changes, so
+# results cached by older code are not reused
+RESULT_VERSIONS = {'summary': 2, 'sentiment': 2, 'keywords': 1}
+
+# BART reads at most 1024 tokens. Longer texts are split on sentence
+# boundaries into chunks of at most SUMMARY_CHUNK_TOKENS, the chunks are
+# summarized together as a batch, and their summaries are summarized again.
+SUMMARY_CHUNK_TOKENS = int(os.environ.get('TIME_CAPSULE_SUMMARY_CHUNK_TOKENS', '900'))
+MAX_SUMMARY_ROUNDS = 3
+
+# Approximate size of each model's weights, used to make room before loading
+SUMMARIZER_SIZE_MB = 700 if QUANTIZE_MODELS else 1550
+SENTIMENT_SIZE_MB = 130 if QUANTIZE_MODELS else 260
+
 # Download necessary NLTK data
 try:
     nltk.data.find('tokenizers/punkt')
 except LookupError:
     nltk.download('punkt')
 
+def _build_pipeline(task, model_name, model_class):
+    """Build a pipeline around a single instance of a model
+    
+    With QUANTIZE_MODELS on a CPU-only host, the linear layers are converted
+    to int8 with dynamic quantization first.
+    """
+    # transformers and torch are only imported once a model is actually needed
+    import torch
+    import transformers
+    
+    model = getattr(transformers, model_class).from_pretrained(model_name)
+    tokenizer = transformers.AutoTokenizer.from_pretrained(model_name)
+    if QUANTIZE_MODELS and not torch.cuda.is_available():
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        logger.info(f"Quantized {model_name} to int8")
+    return transformers.pipeline(task, model=model, tokenizer=tokenizer)
+
+
+def _load_summarizer():
+    return _build_pipeline("summarization", SUMMARIZER_MODEL, "AutoModelForSeq2SeqLM")
+
+
+def _load_summary_tokenizer():
+    # Lets texts be measured without loading the whole summarizer
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(SUMMARIZER_MODEL)
+
+
+def _load_sentiment_analyzer():
+    return _build_pipeline("sentiment-analysis", SENTIMENT_MODEL, "AutoModelForSequenceClassification")
+
+
+def _model_id(model_name):
+    """Model id used in cache keys; quantized models give different results"""
+    return model_name + ('+int8' if QUANTIZE_MODELS else '')
+
+
+def _token_counts(tokenizer, texts):
+    """Number of tokens in each text, without special tokens"""
+    if not texts:
+        return []
+    return [len(ids) for ids in tokenizer(list(texts), add_special_tokens=False)['input_ids']]
+
+
+def _token_chunks(tokenizer, text, budget):
+    """Split a text on sentence boundaries into chunks of at most `budget` tokens
+    
+    A sentence longer than the budget is cut into budget-sized pieces.
+    """
+    sentences = sent_tokenize(text)
+    chunks = []
+    current, current_tokens = [], 0
+    for sentence, tokens in zip(sentences, _token_counts(tokenizer, sentences)):
+        if tokens > budget:
+            ids = tokenizer(sentence, add_special_tokens=False)['input_ids']
+            pieces = [tokenizer.decode(ids[i:i + budget]) for i in range(0, len(ids), budget)]
+        else:
+            pieces = [sentence]
+        for piece in pieces:
+            piece_tokens = min(tokens, budget)
+            if current and current_tokens + piece_tokens > budget:
+                chunks.append(' '.join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+
+def _length_batches(model, texts, batch_size, max_tokens=None, max_length=None):
+    """Split the indices of `texts` into batches of similar token length
+    
+    Sorting by length first means each batch is only padded to the longest
+    of similar texts instead of the longest text overall. With max_tokens,
+    a batch is also cut once it would pad to more tokens than that (texts
+    counted as at most max_length tokens, as they are truncated).
+    """
+    try:
+        lengths = [len(ids) for ids in model.tokenizer(texts)['input_ids']]
+    except Exception:
+        lengths = [len(text.split()) for text in texts]
+    if max_length:
+        lengths = np.minimum(lengths, max_length).tolist()
+    order = np.argsort(lengths, kind='stable').tolist()
+    if not max_tokens:
+        return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+    
+    batches, batch = [], []
+    for j in order:
+        # Lengths are ascending, so the text being added is the longest in the batch
+        if batch and (len(batch) >= batch_size or (len(batch) + 1) * lengths[j] > max_tokens):
+            batches.append(batch)
+            batch = []
+        batch.append(j)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
 class NLPProcessor:
-    def __init__(self):
-        self.summarizer = None
-        self.sentiment_analyzer = None
-        self.tokenizer = None
-        self.model = None
-        self.initialized = False
+    def __init__(self, registry=None, cache=None):
+        self.registry = registry or ModelRegistry(MODEL_MEMORY_BUDGET_MB, MODEL_IDLE_SECONDS)
+        self.registry.register('summarizer', _load_summarizer, SUMMARIZER_SIZE_MB)
+        self.registry.register('summary_tokenizer', _load_summary_tokenizer, 5)
+        self.registry.register('sentiment', _load_sentiment_analyzer, SENTIMENT_SIZE_MB)
+        self.cache = cache or ResultCache(NLP_CACHE_FILE or None, max_disk_mb=NLP_CACHE_MB)
+    
+    def _cached(self, kind, model, texts, params, compute):
+        """Results for texts, computing only those not in the cache
         
-        # Initialize models
-        self._initialize_models()
+        compute(texts) returns one result per text, or None where the model
+        could not produce one; those are not cached and are returned as None.
+        """
+        keys = [result_key(kind, text, model, version=RESULT_VERSIONS[kind], **params) for text in texts]
+        results = [self.cache.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            for i, result in zip(missing, compute([texts[i] for i in missing])):
+                if result is not None:
+                    self.cache.put(keys[i], result)
+                    results[i] = result
+        return results
     
-    def _initialize_models(self):
-        """Initialize the NLP models"""
-        try:
-            # Initialize summarizer
-            try:
-                self.summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
-                logger.info("Summarizer initialized successfully")
-            except Exception as e:
-                logger.error(f"Error initializing summarizer: {e}")
-                self.summarizer = None
-            
-            # Initialize sentiment analysis
-            try:
-                model_name = "distilbert-base-uncased-finetuned-sst-2-english"
-                self.model = AutoModelForSequenceClassification.from_pretrained(model_name)
-                self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-                self.sentiment_analyzer = pipeline("sentiment-analysis", model=model_name)
-                logger.info("Sentiment analyzer initialized successfully")
-            except Exception as e:
-                logger.error(f"Error initializing sentiment analyzer: {e}")
-                self.sentiment_analyzer = None
-            
-            # If at least one model is initialized, consider it a success
-            self.initialized = (self.summarizer is not None) or (self.sentiment_analyzer is not None)
-            
-            if self.initialized:
-                logger.info("NLP models partially or fully initialized")
-            else:
-                logger.warning("No NLP models were initialized, using fallback methods only")
-                
-        except Exception as e:
-            logger.error(f"Error in NLP model initialization: {e}")
-            self.initialized = False
+    @property
+    def summarizer(self):
+        """The summarization pipeline, loaded on first use (None if unavailable)"""
+        return self.registry.get('summarizer')
+    
+    @property
+    def sentiment_analyzer(self):
+        """The sentiment pipeline, loaded on first use (None if unavailable)"""
+        return self.registry.get('sentiment')
     
     def summarize_text(self, text, max_length=150, min_length=30):
         """Generate a summary of the input text"""
-        if self.initialized and self.summarizer:
+        return self.summarize_batch([text], max_length, min_length)[0]
+    
+    def summarize_batch(self, texts, max_length=150, min_length=30, batch_size=None):
+        """Summarize several texts at once; each result is what summarize_text() returns"""
+        texts = list(texts)
+        # Texts that are already short enough are returned as they are
+        tokenizer = self.registry.get('summary_tokenizer') if texts else None
+        if tokenizer:
+            lengths = _token_counts(tokenizer, texts)
+        else:
+            lengths = [len(text.split()) for text in texts]
+        summaries = [text if length < min_length else None for text, length in zip(texts, lengths)]
+        pending = [i for i, summary in enumerate(summaries) if summary is None]
+        if pending:
+            results = self._cached(
+                'summary', _model_id(SUMMARIZER_MODEL), [texts[i] for i in pending],
+                {'max_length': max_length, 'min_length': min_length},
+                lambda missing: self._model_summaries(missing, max_length, min_length, batch_size)
+            )
+            for i, summary in zip(pending, results):
+                summaries[i] = summary
+        
+        # Fallback: Extract first few sentences as summary
+        return [summary if summary is not None else self._extract_summary_fallback(text, max_length)
+                for text, summary in zip(texts, summaries)]
+    
+    def _model_summaries(self, texts, max_length, min_length, batch_size=None):
+        """Summaries from the model, with None where it could not produce one
+        
+        Texts too long for the model are summarized map-reduce style: their
+        chunks are summarized (all texts' chunks in one batched run), and the
+        joined chunk summaries take the text's place, until it fits.
+        """
+        summarizer = self.summarizer
+        if not summarizer:
+            return [None] * len(texts)
+        tokenizer = summarizer.tokenizer
+        
+        inputs = dict(enumerate(texts))
+        failed = set()
+        for _ in range(MAX_SUMMARY_ROUNDS):
+            lengths = dict(zip(inputs, _token_counts(tokenizer, inputs.values())))
+            long_texts = [i for i in inputs if lengths[i] > SUMMARY_CHUNK_TOKENS]
+            if not long_texts:
+                break
+            
+            # Map: summarize every chunk of every long text together
+            chunks = [(i, chunk) for i in long_texts
+                      for chunk in _token_chunks(tokenizer, inputs[i], SUMMARY_CHUNK_TOKENS)]
+            partials = self._run_summarizer(summarizer, [chunk for _, chunk in chunks],
+                                            max_length, min_length, batch_size)
+            joined = {}
+            for (i, _), partial in zip(chunks, partials):
+                if partial is None:
+                    failed.add(i)
+                joined.setdefault(i, []).append(partial)
+            for i in long_texts:
+                if i in failed:
+                    del inputs[i]
+                else:
+                    inputs[i] = ' '.join(joined[i])
+        
+        # Reduce: summarize each text, or the joined summaries of its chunks
+        order = list(inputs)
+        results = self._run_summarizer(summarizer, [inputs[i] for i in order], max_length, min_length, batch_size)
+        summaries = [None] * len(texts)
+        for i, summary in zip(order, results):
+            summaries[i] = summary
+        return summaries
+    
+    def _run_summarizer(self, summarizer, texts, max_length, min_length, batch_size=None):
+        """Run texts through the summarizer in length-sorted batches (None where it failed)"""
+        summaries = [None] * len(texts)
+        for batch in _length_batches(summarizer, texts, batch_size or NLP_BATCH_SIZE):
             try:
-                if len(text.split()) < min_length:
-                    return text  # Text is already short enough
-                
-                summary = self.summarizer(text, max_length=max_length, min_length=min_length, do_sample=False)
-                return summary[0]['summary_text']
+                # Truncation only applies if a text is still too long after MAX_SUMMARY_ROUNDS
+                results = summarizer([texts[j] for j in batch], max_length=max_length, min_length=min_length,
+                                     do_sample=False, truncation=True, batch_size=len(batch))
+                for j, result in zip(batch, results):
+                    summaries[j] = result['summary_text']
             except Exception as e:
                 logger.error(f"Error summarizing text with model: {e}")
-                # Fall through to fallback method
-        
-        # Fallback: Extract first few sentences as summary
-        return self._extract_summary_fallback(text, max_length)
+        return summaries
     
     def _extract_summary_fallback(self, text, max_length=150):
         """Fallback method to extract summary when model is not available"""
@@ -108,38 +309,69 @@ class NLPProcessor:
     
     def analyze_sentiment(self, text):
         """Analyze the sentiment of the input text"""
-        if self.initialized and self.sentiment_analyzer:
+        return self.analyze_sentiment_batch([text])[0]
+    
+    def analyze_sentiment_batch(self, texts, batch_size=None):
+        """Analyze several texts at once; each result is what analyze_sentiment() returns
+        
+        The whole texts and the sentences of long texts are classified
+        together, in batches of similar length.
+        """
+        texts = list(texts)
+        results = self._cached('sentiment', _model_id(SENTIMENT_MODEL), texts, {},
+                               lambda missing: self._model_sentiments(missing, batch_size))
+        
+        # Fallback to TextBlob
+        return [result if result is not None else self._textblob_sentiment(text)
+                for text, result in zip(texts, results)]
+    
+    def _model_sentiments(self, texts, batch_size=None):
+        """Sentiments from the model, with None where it could not produce one
+        
+        The score is the model's probability that the text is positive; for
+        long texts, the average over sentences weighted by sentence length.
+        """
+        results = [None] * len(texts)
+        sentiment_analyzer = self.sentiment_analyzer
+        if not sentiment_analyzer:
+            return results
+        
+        # For longer texts, analyze each sentence and average the results
+        pieces = []
+        for i, text in enumerate(texts):
+            if len(text.split()) > 100:
+                pieces.extend((i, sentence) for sentence in sent_tokenize(text))
+            else:
+                pieces.append((i, text))
+        
+        piece_texts = [piece for _, piece in pieces]
+        positive = np.zeros(len(pieces))
+        failed = set()
+        batches = _length_batches(sentiment_analyzer, piece_texts, batch_size or NLP_BATCH_SIZE,
+                                  SENTIMENT_BATCH_TOKENS, SENTIMENT_MAX_TOKENS)
+        for batch in batches:
             try:
-                # For longer texts, analyze each sentence and average the results
-                if len(text.split()) > 100:
-                    sentences = sent_tokenize(text)
-                    sentiments = self.sentiment_analyzer(sentences)
-                    
-                    # Calculate weighted average based on sentence length
-                    total_score = 0
-                    total_weight = 0
-                    
-                    for sent, sentiment in zip(sentences, sentiments):
-                        weight = len(sent.split())
-                        score = 1 if sentiment['label'] == 'POSITIVE' else 0
-                        total_score += score * weight
-                        total_weight += weight
-                    
-                    avg_sentiment = total_score / total_weight if total_weight > 0 else 0.5
-                    
-                    # Map to emotional categories
-                    return self._map_sentiment_to_emotion(avg_sentiment)
-                else:
-                    # For shorter texts, analyze the whole text
-                    result = self.sentiment_analyzer(text)[0]
-                    score = 1 if result['label'] == 'POSITIVE' else 0
-                    return self._map_sentiment_to_emotion(score)
+                labels = sentiment_analyzer([piece_texts[j] for j in batch], batch_size=len(batch), truncation=True)
+                for j, label in zip(batch, labels):
+                    positive[j] = label['score'] if label['label'] == 'POSITIVE' else 1 - label['score']
             except Exception as e:
                 logger.error(f"Error analyzing sentiment with model: {e}")
                 # Fall through to fallback method
+                failed.update(pieces[j][0] for j in batch)
         
-        # Fallback to TextBlob
-        return self._textblob_sentiment(text)
+        # Weighted average per text based on sentence length
+        owners = np.array([i for i, _ in pieces], dtype=np.int64)
+        weights = np.array([max(len(piece.split()), 1) for piece in piece_texts], dtype=float)
+        totals = np.bincount(owners, weights * positive, minlength=len(texts))
+        total_weights = np.bincount(owners, weights, minlength=len(texts))
+        scores = np.divide(totals, total_weights, out=np.full(len(texts), 0.5), where=total_weights > 0)
+        
+        for i, score in enumerate(scores.tolist()):
+            if i not in failed:
+                # Map to emotional categories
+                results[i] = self._map_sentiment_to_emotion(score)
+        
+        return results
     
     def _textblob_sentiment(self, text):
         """Fallback sentiment analysis using TextBlob"""
@@ -195,6 +427,10 @@ class NLPProcessor:
     
     def extract_keywords(self, text, top_n=5):
         """Extract key phrases or topics from the text"""
+        return self._cached('keywords', 'tfidf', [text], {'top_n': top_n},
+                            lambda missing: [self._tfidf_keywords(missing[0], top_n)])[0]
+    
+    def _tfidf_keywords(self, text, top_n=5):
         try:
             # Simple TF-IDF based keyword extraction
             vectorizer = TfidfVectorizer(max_features=100, stop_words='english')
@@ -232,6 +468,49 @@ class NLPProcessor:
                 logger.error(f"Error in fallback keyword extraction: {e2}")
                 return []
 
+    def extract_keywords_batch(self, texts, top_n=5):
+        """Extract keywords from several texts; each result is what extract_keywords() returns"""
+        return self._cached('keywords', 'tfidf', texts, {'top_n': top_n},
+                            lambda missing: self._tfidf_keywords_batch(missing, top_n))
+    
+    def _tfidf_keywords_batch(self, texts, top_n=5):
+        """_tfidf_keywords() for several texts, with a single vectorizer
+        
+        Fitted on one text, TF-IDF has a constant IDF, so ranking the counts
+        of each row exactly as _tfidf_keywords() ranks its scores gives the
+        same keywords as fitting a vectorizer per text.
+        """
+        texts = list(texts)
+        try:
+            vectorizer = CountVectorizer(stop_words='english')
+            X = vectorizer.fit_transform(texts).tocsr()
+        except Exception:
+            # e.g. no text has a single word that is not a stop word
+            return [self._tfidf_keywords(text, top_n) for text in texts]
+        
+        feature_names = vectorizer.get_feature_names_out()
+        keywords = []
+        for i, text in enumerate(texts):
+            row = X.getrow(i)
+            if not row.nnz:
+                keywords.append(self._tfidf_keywords(text, top_n))
+                continue
+            # Columns are in alphabetical order, as in a vocabulary fitted on this text alone
+            order = np.argsort(row.indices)
+            columns = row.indices[order]
+            counts = row.data[order].astype(np.float64)
+            
+            # Same cut as max_features=100 on a single text
+            if len(columns) > 100:
+                keep = np.zeros(len(columns), dtype=bool)
+                keep[(-counts).argsort()[:100]] = True
+                columns, counts = columns[keep], counts[keep]
+            
+            scores = counts / np.sqrt(np.sum(counts ** 2))
+            sorted_indices = np.argsort(scores)[::-1]
+            keywords.append([feature_names[columns[j]] for j in sorted_indices[:top_n]])
+        return keywords
+
 # Create a singleton instance
 nlp_processor = NLPProcessor()
 
@@ -242,6 +521,15 @@ def summarize_text(text, max_length=150, min_length=30):
 def analyze_sentiment(text):
     return nlp_processor.analyze_sentiment(text)
 
+def summarize_batch(texts, max_length=150, min_length=30, batch_size=None):
+    return nlp_processor.summarize_batch(texts, max_length, min_length, batch_size)
+
+def analyze_sentiment_batch(texts, batch_size=None):
+    return nlp_processor.analyze_sentiment_batch(texts, batch_size)
+
+def extract_keywords_batch(texts, top_n=5):
+    return nlp_processor.extract_keywords_batch(texts, top_n)
+
 def cluster_entries(entries, n_clusters=5):
     return nlp_processor.cluster_entries(entries, n_clusters)
 
@@ -7,10 +7,13 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.utils.firebase import add_entry
-from app.models.summarizer import summarize_text, analyze_sentiment, extract_keywords
+from app.models.enrichment import enrich_entry, resume_pending
 
 def show_home_page():
     st.title("New Memory Entry")
+    
+    # Pick up entries whose analysis was interrupted by a restart
+    resume_pending()
     st.subheader("Capture your thoughts, reflections, and experiences")
     
     # Date selection
@@ -48,53 +51,70 @@ def show_home_page():
         submit_button = st.button("Save Entry", type="primary", use_container_width=True)
     
     if submit_button and entry_content:
-        with st.spinner("Processing your entry..."):
-            # Process the entry with NLP
-            summary = summarize_text(entry_content, max_length=100, min_length=20)
-            sentiment = analyze_sentiment(entry_content)
-            keywords = extract_keywords(entry_content)
-            
-            # Prepare entry data
+        with st.spinner("Saving your entry..."):
+            # Prepare entry data; the AI analysis is added in the background
             entry_data = {
                 "title": entry_title,
                 "content": entry_content,
                 "date": entry_date.isoformat(),
                 "timestamp": datetime.datetime.now(),
                 "mood": selected_mood,
-                "tags": [tag.strip() for tag in tags.split(",")] if tags else [],
+                "tags": [tag.strip() for tag in tags.split(",") if tag.strip()],
                 "is_private": is_private,
-                "summary": summary,
-                "sentiment": sentiment,
-                "keywords": keywords
+                "analysis_status": "pending"
             }
             
             # Save to Firebase
             try:
                 entry_id = add_entry(entry_data)
-                if entry_id:
-                    st.success("Entry saved successfully!")
-                    
-                    # Show summary and analysis
-                    st.subheader("AI Analysis")
-                    
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.markdown("**Summary:**")
-                        st.write(summary)
-                    
-                    with col2:
-                        st.markdown("**Emotional Tone:**")
-                        st.write(f"{sentiment['emotion'].title()} ({sentiment['score']:.2f})")
-                        
-                        st.markdown("**Keywords:**")
-                        st.write(", ".join(keywords))
-                    
-                    # Clear the form
-                    st.button("Write Another Entry")
-                else:
+                if not entry_id:
                     st.error("Failed to save entry. Please try again.")
             except Exception as e:
+                entry_id = None
                 st.error(f"Error: {str(e)}")
+        
+        if entry_id:
+            st.success("Entry saved successfully!")
+            
+            # Analyze the entry in the background; the results are saved to
+            # it as they come in, even if you leave this page
+            job = enrich_entry(entry_id, entry_content)
+            
+            # Show summary and analysis
+            st.subheader("AI Analysis")
+            progress = st.progress(job.progress(), text="Analyzing your entry...")
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                st.markdown("**Summary:**")
+                summary_slot = st.empty()
+            
+            with col2:
+                st.markdown("**Emotional Tone:**")
+                sentiment_slot = st.empty()
+                
+                st.markdown("**Keywords:**")
+                keywords_slot = st.empty()
+            
+            slots = {'summary': summary_slot, 'sentiment': sentiment_slot, 'keywords': keywords_slot}
+            for slot in slots.values():
+                slot.caption("Analyzing...")
+            
+            # Fill in each result as soon as it is ready
+            for field, result in job.as_completed():
+                if result is None:
+                    slots[field].caption("Not available")
+                elif field == 'summary':
+                    summary_slot.write(result)
+                elif field == 'sentiment':
+                    sentiment_slot.write(f"{result['emotion'].title()} ({result['score']:.2f})")
+                else:
+                    keywords_slot.write(", ".join(result))
+                progress.progress(job.progress(), text="Analyzing your entry...")
+            progress.empty()
+            
+            # Clear the form
+            st.button("Write Another Entry")
     elif submit_button:
         st.warning("Please write something before saving.")
     
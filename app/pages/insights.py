@@ -14,7 +14,8 @@ import numpy as np
 # Add the parent directory to the path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.utils.firebase import get_entries
+from app.utils.firebase import get_entries, get_stats
+from app.utils.dates import entry_day_ordinal
 from app.models.summarizer import extract_keywords
 
 def show_insights_page():
@@ -43,30 +44,24 @@ def show_insights_page():
     days_to_include = time_periods[selected_period]
     
     # Filter entries by time period
-    cutoff_date = datetime.datetime.now() - datetime.timedelta(days=days_to_include)
-    filtered_entries = []
+    cutoff_ordinal = (datetime.date.today() - datetime.timedelta(days=days_to_include)).toordinal()
+    filtered_entries = [entry for entry in entries if entry_day_ordinal(entry) >= cutoff_ordinal]
     
-    for entry in entries:
-        try:
-            entry_date = datetime.datetime.fromisoformat(entry.get('date', '')).date()
-            entry_datetime = datetime.datetime.combine(entry_date, datetime.time())
-        except (ValueError, TypeError):
-            entry_datetime = entry.get('timestamp', datetime.datetime.now())
-        
-        if entry_datetime >= cutoff_date:
-            filtered_entries.append(entry)
+    # Running statistics cover the whole archive, not just the fetched entries
+    stats = get_stats(since_ordinal=cutoff_ordinal)
+    if stats.get('building'):
+        st.info("Statistics are being counted from your entries; reload the page in a moment.")
     
     # Display metrics
-    if filtered_entries:
+    if stats['count']:
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            st.metric("Total Entries", len(filtered_entries))
+            st.metric("Total Entries", stats['count'])
         
         with col2:
-            # Calculate average sentiment
-            sentiment_scores = [entry.get('sentiment', {}).get('score', 0.5) for entry in filtered_entries]
-            avg_sentiment = sum(sentiment_scores) / len(sentiment_scores) if sentiment_scores else 0
+            # Average sentiment
+            avg_sentiment = stats['avg_sentiment']
             
             # Map to emotional category
             if avg_sentiment >= 0.8:
@@ -84,48 +79,21 @@ def show_insights_page():
         
         with col3:
             # Count unique tags
-            all_tags = []
-            for entry in filtered_entries:
-                all_tags.extend(entry.get('tags', []))
-            
-            unique_tags = len(set(all_tags))
-            st.metric("Unique Topics", unique_tags)
+            st.metric("Unique Topics", len(stats['tags']))
         
         with col4:
-            # Calculate writing streak
-            dates = []
-            for entry in filtered_entries:
-                try:
-                    entry_date = datetime.datetime.fromisoformat(entry.get('date', '')).date()
-                except (ValueError, TypeError):
-                    entry_date = entry.get('timestamp', datetime.datetime.now()).date()
-                
-                dates.append(entry_date)
-            
-            # Count consecutive days
-            if dates:
-                dates.sort(reverse=True)
-                streak = 1
-                for i in range(1, len(dates)):
-                    if (dates[i-1] - dates[i]).days == 1:
-                        streak += 1
-                    else:
-                        break
-                
-                st.metric("Current Streak", f"{streak} days")
-            else:
-                st.metric("Current Streak", "0 days")
+            # Consecutive days with entries
+            st.metric("Current Streak", f"{stats['streak']} days")
+    
+    # Count sentiment categories
+    sentiment_counts = Counter()
+    for sentiment, count in stats['emotions'].items():
+        sentiment_counts[sentiment.title()] += count
     
     # Emotional distribution chart
-    if filtered_entries:
+    if stats['count']:
         st.subheader("Emotional Distribution")
         
-        # Count sentiment categories
-        sentiment_counts = Counter()
-        for entry in filtered_entries:
-            sentiment = entry.get('sentiment', {}).get('emotion', 'neutral')
-            sentiment_counts[sentiment.title()] += 1
-        
         # Prepare data for pie chart
         labels = list(sentiment_counts.keys())
         values = list(sentiment_counts.values())
@@ -232,17 +200,8 @@ def show_insights_page():
     # Common themes visualization (replaced wordcloud with bar chart)
     st.subheader("Common Themes & Topics")
     
-    # Extract all tags and keywords
-    all_tags = []
-    all_keywords = []
-    
-    for entry in filtered_entries:
-        all_tags.extend(entry.get('tags', []))
-        all_keywords.extend(entry.get('keywords', []))
-    
     # Combine tags and keywords
-    all_terms = all_tags + all_keywords
-    term_counts = Counter(all_terms)
+    term_counts = stats['tags'] + stats['keywords']
     
     # Display top terms
     if term_counts:
@@ -269,22 +228,11 @@ def show_insights_page():
         st.info("Add more entries with tags and keywords to see common themes.")
     
     # Monthly writing activity
-    if filtered_entries:
+    if stats['count']:
         st.subheader("Writing Activity")
         
-        # Count entries by month
-        entries_by_month = {}
-        for entry in filtered_entries:
-            try:
-                entry_date = datetime.datetime.fromisoformat(entry.get('date', '')).date()
-            except (ValueError, TypeError):
-                entry_date = entry.get('timestamp', datetime.datetime.now()).date()
-            
-            month_key = entry_date.strftime("%Y-%m")
-            if month_key not in entries_by_month:
-                entries_by_month[month_key] = 0
-            
-            entries_by_month[month_key] += 1
+        # Entries by month
+        entries_by_month = stats['months']
         
         # Sort months chronologically
         sorted_months = sorted(entries_by_month.keys())
@@ -310,15 +258,14 @@ def show_insights_page():
         st.plotly_chart(fig, use_container_width=True)
     
     # AI-generated insights
-    if filtered_entries:
+    if stats['count']:
         st.subheader("AI Insights")
         
         # Generate some example insights based on the data
         insights = []
         
         # Mood trends
-        sentiment_scores = [entry.get('sentiment', {}).get('score', 0.5) for entry in filtered_entries]
-        avg_sentiment = sum(sentiment_scores) / len(sentiment_scores) if sentiment_scores else 0
+        avg_sentiment = stats['avg_sentiment']
         
         if avg_sentiment > 0.7:
             insights.append("Your entries show a consistently positive emotional tone. Keep up the good vibes!")
@@ -326,8 +273,8 @@ def show_insights_page():
             insights.append("Your recent entries show a more negative emotional tone. Consider reflecting on what might be affecting your mood.")
         
         # Writing frequency
-        if len(filtered_entries) > 10 and selected_period in ["Last 30 days", "Last 90 days"]:
-            insights.append(f"You've written {len(filtered_entries)} entries in this period. Regular reflection is great for emotional well-being!")
+        if stats['count'] > 10 and selected_period in ["Last 30 days", "Last 90 days"]:
+            insights.append(f"You've written {stats['count']} entries in this period. Regular reflection is great for emotional well-being!")
         
         # Most common emotions
         if sentiment_counts:
@@ -8,12 +8,44 @@ import os
 # Add the parent directory to the path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.utils.firebase import get_entries, delete_entry
+from app.utils.firebase import (get_entries_page, get_entry, delete_entry, search_entries, get_chart_frame,
+                                SUMMARY_FIELDS, MAX_ARRAY_CONTAINS_ANY)
+from app.utils.tags import normalize_tags
+from app.utils.dates import entry_day_ordinal, entry_month_key
+
+# Number of entries fetched per page of history
+PAGE_SIZE = 100
+
+def reset_timeline_pages():
+    """Go back to showing only the first page of entries"""
+    st.session_state.pop('timeline_pages', None)
+    st.session_state.pop('timeline_cursor', None)
+
+def load_timeline_entries():
+    """Fetch the pages of entries shown so far
+    
+    Read again on every render, so analysis results and entries saved in
+    other sessions show up; the session only keeps how many pages to show.
+    """
+    entries, cursor = get_entries_page(
+        limit=PAGE_SIZE * st.session_state.get('timeline_pages', 1),
+        filters=st.session_state.get('timeline_filters'),
+        fields=SUMMARY_FIELDS
+    )
+    st.session_state['timeline_cursor'] = cursor
+    return entries
 
 def show_timeline_page():
     st.title("Memory Timeline")
     st.subheader("Explore your journey through time")
     
+    # Full-text search
+    search_query = st.text_input(
+        "Search memories",
+        placeholder="Search titles, content, keywords and tags",
+        help="Results are ranked by relevance and still respect the filters below"
+    ).strip()
+    
     # Filters
     with st.expander("Filters", expanded=False):
         col1, col2 = st.columns(2)
@@ -45,57 +77,47 @@ def show_timeline_page():
             sentiment_options = ["All", "Very Positive", "Positive", "Neutral", "Negative", "Very Negative"]
             selected_sentiment = st.selectbox("Filter by emotional tone", sentiment_options)
     
+    # Build the query filters; they are applied by the storage backend so
+    # only matching entries are fetched
+    filters = {}
+    if len(date_range) == 2:
+        filters['start_date'] = date_range[0].isoformat()
+        filters['end_date'] = date_range[1].isoformat()
+    if selected_mood != "All":
+        filters['mood'] = selected_mood
+    if selected_sentiment != "All":
+        filters['emotion'] = selected_sentiment.lower()
+    if tags_filter:
+        filter_tags = [tag.strip() for tag in tags_filter.split(',') if tag.strip()]
+        if len(normalize_tags(filter_tags)) > MAX_ARRAY_CONTAINS_ANY:
+            st.warning(f"You can filter on at most {MAX_ARRAY_CONTAINS_ANY} tags at a time.")
+            return
+        if filter_tags:
+            filters['tags'] = filter_tags
+    
+    # Start paging from the top again whenever the filters change
+    if st.session_state.get('timeline_filters') != filters:
+        reset_timeline_pages()
+        st.session_state['timeline_filters'] = filters
+    
     # Get entries from Firebase
     with st.spinner("Loading your memories..."):
-        entries = get_entries(limit=100)
+        if search_query:
+            # Ranked search results replace the paged history
+            filtered_entries = search_entries(search_query, limit=PAGE_SIZE, filters=filters, fields=SUMMARY_FIELDS)
+        else:
+            filtered_entries = load_timeline_entries()
         
-        if not entries:
+        if not filtered_entries and not filters and not search_query:
             st.info("No entries found. Start by adding a new entry on the 'New Entry' page.")
             return
-        
-        # Apply filters
-        filtered_entries = []
-        for entry in entries:
-            # Convert string date to datetime for comparison
-            try:
-                entry_date = datetime.datetime.fromisoformat(entry.get('date', '')).date()
-            except (ValueError, TypeError):
-                # If date parsing fails, use timestamp
-                entry_date = entry.get('timestamp', datetime.datetime.now()).date()
-            
-            # Apply date filter
-            if len(date_range) == 2:
-                if not (date_range[0] <= entry_date <= date_range[1]):
-                    continue
-            
-            # Apply mood filter
-            if selected_mood != "All" and entry.get('mood', '') != selected_mood:
-                continue
-            
-            # Apply sentiment filter
-            if selected_sentiment != "All" and entry.get('sentiment', {}).get('emotion', '').lower() != selected_sentiment.lower():
-                continue
-            
-            # Apply tags filter
-            if tags_filter:
-                filter_tags = [tag.strip().lower() for tag in tags_filter.split(',')]
-                entry_tags = [tag.lower() for tag in entry.get('tags', [])]
-                if not any(tag in entry_tags for tag in filter_tags):
-                    continue
-            
-            filtered_entries.append(entry)
     
     # Display emotional trend chart
-    if filtered_entries:
-        st.subheader("Emotional Trends")
-        
-        # Prepare data for the chart
+    if search_query:
+        # Chart the search results
         chart_data = []
         for entry in filtered_entries:
-            try:
-                entry_date = datetime.datetime.fromisoformat(entry.get('date', '')).date()
-            except (ValueError, TypeError):
-                entry_date = entry.get('timestamp', datetime.datetime.now()).date()
+            entry_date = datetime.date.fromordinal(entry_day_ordinal(entry))
             
             sentiment_score = entry.get('sentiment', {}).get('score', 0.5)
             sentiment_category = entry.get('sentiment', {}).get('emotion', 'neutral')
@@ -107,11 +129,17 @@ def show_timeline_page():
                 'title': entry.get('title', 'Untitled')
             })
         
-        # Create DataFrame
         df = pd.DataFrame(chart_data)
-        
-        # Sort by date
-        df = df.sort_values('date')
+        if not df.empty:
+            df = df.sort_values('date')
+    else:
+        # Chart every matching entry (not just the loaded pages) straight
+        # from the columnar snapshot; it comes back sorted by date
+        df = get_chart_frame(filters)
+        df['sentiment_category'] = df['emotion'].str.title()
+    
+    if not df.empty:
+        st.subheader("Emotional Trends")
         
         # Create line chart
         fig = px.line(
@@ -156,18 +184,17 @@ def show_timeline_page():
     # Display entries in timeline format
     st.subheader("Your Memories")
     
+    if search_query:
+        st.caption(f"{len(filtered_entries)} memories match \"{search_query}\"")
+    
     if not filtered_entries:
         st.info("No entries match your filters. Try adjusting your filter criteria.")
     else:
         # Group entries by month
         entries_by_month = {}
         for entry in filtered_entries:
-            try:
-                entry_date = datetime.datetime.fromisoformat(entry.get('date', '')).date()
-            except (ValueError, TypeError):
-                entry_date = entry.get('timestamp', datetime.datetime.now()).date()
-            
-            month_key = entry_date.strftime("%B %Y")
+            # "YYYY-MM" keys sort chronologically as strings
+            month_key = entry_month_key(entry)
             if month_key not in entries_by_month:
                 entries_by_month[month_key] = []
             
@@ -176,16 +203,16 @@ def show_timeline_page():
         # Sort months in reverse chronological order
         sorted_months = sorted(
             entries_by_month.keys(),
-            key=lambda x: datetime.datetime.strptime(x, "%B %Y"),
             reverse=True
         )
         
         # Display entries by month
         for month in sorted_months:
-            with st.expander(month, expanded=(month == sorted_months[0])):
+            month_label = datetime.datetime.strptime(month, "%Y-%m").strftime("%B %Y")
+            with st.expander(month_label, expanded=(month == sorted_months[0])):
                 for entry in sorted(
                     entries_by_month[month],
-                    key=lambda x: datetime.datetime.fromisoformat(x.get('date', '')).date() if isinstance(x.get('date', ''), str) else x.get('timestamp', datetime.datetime.now()).date(),
+                    key=entry_day_ordinal,
                     reverse=True
                 ):
                     col1, col2 = st.columns([4, 1])
@@ -201,6 +228,11 @@ def show_timeline_page():
                             'very negative': '#dc3545'
                         }.get(sentiment.lower(), '#6c757d')
                         
+                        # The list has no content to fall back on while the summary is missing
+                        summary = entry.get('summary') or (
+                            '<em>Analyzing…</em>' if entry.get('analysis_status') == 'pending'
+                            else '<em>No summary</em>')
+                        
                         st.markdown(f"""
                         <div style="border-left: 5px solid {sentiment_color}; padding-left: 10px; margin-bottom: 20px;">
                             <h4>{entry.get('title', 'Untitled')}</h4>
@@ -208,7 +240,7 @@ def show_timeline_page():
                                 {entry.get('date', '')} • {entry.get('mood', 'No mood')} • 
                                 <span style="color: {sentiment_color};">{sentiment.title()}</span>
                             </p>
-                            <p>{entry.get('summary', entry.get('content', '')[:100] + '...')}</p>
+                            <p>{summary}</p>
                             <p style="font-size: 0.8em;">
                                 {', '.join([f'<span style="background-color: #f8f9fa; padding: 2px 5px; border-radius: 3px; margin-right: 5px;">{tag}</span>' for tag in entry.get('tags', [])])}
                             </p>
@@ -218,7 +250,8 @@ def show_timeline_page():
                     with col2:
                         # View full entry button
                         if st.button("View", key=f"view_{entry.get('id', '')}", help="View full entry"):
-                            st.session_state['selected_entry'] = entry
+                            # The list only holds summary fields; load the full entry now
+                            st.session_state['selected_entry'] = get_entry(entry.get('id')) or entry
                         
                         # Delete entry button
                         if st.button("Delete", key=f"delete_{entry.get('id', '')}", help="Delete this entry"):
@@ -228,6 +261,13 @@ def show_timeline_page():
                             else:
                                 st.error("Failed to delete entry.")
     
+    # Page through older history on demand
+    if not search_query and st.session_state.get('timeline_cursor'):
+        st.caption(f"Showing the {len(filtered_entries)} most recent matching entries")
+        if st.button("Load older memories"):
+            st.session_state['timeline_pages'] = st.session_state.get('timeline_pages', 1) + 1
+            st.experimental_rerun()
+    
     # Display full entry if selected
     if 'selected_entry' in st.session_state:
         entry = st.session_state['selected_entry']
@@ -241,6 +281,8 @@ def show_timeline_page():
             st.write(entry.get('content', ''))
             
             st.markdown("**AI Analysis:**")
+            if entry.get('analysis_status') == 'pending':
+                st.caption("Still analyzing this entry; results will appear here when ready.")
             st.write(f"Emotional tone: {entry.get('sentiment', {}).get('emotion', 'neutral').title()}")
             st.write(f"Summary: {entry.get('summary', 'No summary available')}")
             
@@ -0,0 +1,354 @@
+import os
+import json
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from app.utils.dates import entry_day_ordinal
+
+# Fields read when building the snapshot from stored entries
+COLUMN_FIELDS = ['title', 'date', 'timestamp', 'day_ordinal', 'mood', 'sentiment', 'tags']
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def affects_columns(data):
+    """Whether an update touches any field kept in the snapshot"""
+    return any(field in data for field in COLUMN_FIELDS)
+
+
+def _pack_strings(strings):
+    """Strings as one UTF-8 byte array plus end offsets (much smaller than fixed-width str arrays)"""
+    encoded = [string.encode('utf-8') for string in strings]
+    ends = np.cumsum([len(data) for data in encoded], dtype=np.int64)
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), ends
+
+
+def _unpack_strings(blob, ends):
+    data = blob.tobytes()
+    starts = [0] + ends[:-1].tolist()
+    return [data[start:end].decode('utf-8') for start, end in zip(starts, ends.tolist())]
+
+
+def _row(entry):
+    """Values an entry contributes to the snapshot, as written to the change log"""
+    sentiment = entry.get('sentiment') or {}
+    if not isinstance(sentiment, dict):
+        sentiment = {}
+    return {
+        'day': int(entry_day_ordinal(entry)),
+        'score': float(sentiment.get('score', 0.5)),
+        'emotion': str(sentiment.get('emotion', 'neutral')).lower(),
+        'mood': str(entry.get('mood') or ''),
+        'title': str(entry.get('title') or 'Untitled'),
+        'tags': sorted({str(tag).strip().lower() for tag in entry.get('tags') or [] if str(tag).strip()}),
+    }
+
+
+def _grow(array, size):
+    """Return `array` with room for at least `size` rows"""
+    if size <= len(array):
+        return array
+    grown = np.zeros(max(size, 2 * len(array)), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class ColumnarSnapshot:
+    """Chartable entry fields kept as NumPy columns.
+
+    Each entry is a row of day ordinal, sentiment score, emotion code and
+    mood code; tags are stored as (row, tag code) pairs. Codes index small
+    vocabularies, so filters and aggregations are vectorized comparisons.
+    Changing or deleting an entry marks its row dead and appends a new one;
+    dead rows are dropped once they make up half the snapshot. With a path
+    the snapshot is saved as an uncompressed .npz, and every change is
+    appended to a JSONL log next to it that is folded into the .npz once it
+    outgrows the snapshot, so a write costs one short line.
+
+    Changes made before the snapshot is first built are ignored; rebuild()
+    picks them up from the stored entries.
+    """
+
+    def __init__(self, path=None, compact_threshold=1000):
+        self.path = path
+        self.log_path = os.path.splitext(path)[0] + '.jsonl' if path else None
+        self.compact_threshold = compact_threshold
+        self._lock = threading.RLock()
+        self._built = False
+        self._log_records = 0
+        self._reset()
+        if path and os.path.exists(path):
+            self._load()
+
+    def _reset(self):
+        self._rows = 0
+        self._row_of = {}
+        self._ids = []
+        self._titles = []
+        self._day = np.zeros(1024, dtype=np.int32)
+        self._score = np.zeros(1024, dtype=np.float32)
+        self._emotion = np.zeros(1024, dtype=np.int16)
+        self._mood = np.zeros(1024, dtype=np.int16)
+        self._alive = np.zeros(1024, dtype=bool)
+        self._tag_pairs = 0
+        self._tag_row = np.zeros(1024, dtype=np.int32)
+        self._tag_code = np.zeros(1024, dtype=np.int32)
+        self.emotions, self.moods, self.tags = [], [], []
+        self._codes = {'emotions': {}, 'moods': {}, 'tags': {}}
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def exists(self):
+        """Whether the snapshot has been built (it may still be empty)"""
+        return self._built
+
+    def _load(self):
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                alive = data['alive']
+                self._rows = len(alive)
+                self._ids = self._load_strings(data, 'ids')
+                self._titles = self._load_strings(data, 'titles')
+                self._day = data['day']
+                self._score = data['score']
+                self._emotion = data['emotion']
+                self._mood = data['mood']
+                self._alive = alive
+                self._tag_row = data['tag_row']
+                self._tag_code = data['tag_code']
+                self._tag_pairs = len(self._tag_row)
+                for name in ('emotions', 'moods', 'tags'):
+                    setattr(self, name, self._load_strings(data, name))
+                    self._codes[name] = {value: code for code, value in enumerate(getattr(self, name))}
+            self._row_of = {entry_id: row for row, entry_id in enumerate(self._ids) if self._alive[row]}
+            self._built = True
+        except Exception as e:
+            print(f"Error reading columnar snapshot, rebuilding it: {e}")
+            self._reset()
+            return
+        self._replay()
+
+    @staticmethod
+    def _load_strings(data, name):
+        if name + '_blob' in data:
+            return _unpack_strings(data[name + '_blob'], data[name + '_ends'])
+        # Snapshots saved before strings were packed
+        return data[name].tolist()
+
+    def _replay(self):
+        """Apply the changes logged since the .npz was last saved"""
+        if not os.path.exists(self.log_path):
+            return
+        try:
+            with open(self.log_path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn write from a crash; everything before it is intact
+                        break
+                    self._kill(record['id'])
+                    if record['row'] is not None:
+                        self._append(record['id'], record['row'])
+                    self._log_records += 1
+            self._compact()
+        except Exception as e:
+            print(f"Error reading columnar snapshot log: {e}")
+
+    def _log(self, records):
+        """Append changes to the log, folding it into the .npz once it outgrows the snapshot"""
+        if not self.path:
+            return
+        try:
+            with open(self.log_path, 'a') as f:
+                for entry_id, row in records:
+                    f.write(json.dumps({'id': entry_id, 'row': row}) + '\n')
+            self._log_records += len(records)
+        except Exception as e:
+            print(f"Error saving columnar snapshot: {e}")
+            return
+        if self._log_records > max(self.compact_threshold, len(self._row_of)):
+            self._save()
+
+    def _save(self):
+        """Write the whole snapshot to the .npz and start a new log"""
+        if not self.path:
+            return
+        n, t = self._rows, self._tag_pairs
+        tmp_path = self.path + '.tmp.npz'
+        strings = {}
+        for name, values in (('ids', self._ids), ('titles', self._titles), ('emotions', self.emotions),
+                             ('moods', self.moods), ('tags', self.tags)):
+            strings[name + '_blob'], strings[name + '_ends'] = _pack_strings(values)
+        try:
+            np.savez(
+                tmp_path,
+                day=self._day[:n], score=self._score[:n], emotion=self._emotion[:n], mood=self._mood[:n],
+                alive=self._alive[:n], tag_row=self._tag_row[:t], tag_code=self._tag_code[:t],
+                **strings
+            )
+            os.replace(tmp_path, self.path)
+            open(self.log_path, 'w').close()
+            self._log_records = 0
+        except Exception as e:
+            print(f"Error saving columnar snapshot: {e}")
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+    def _code(self, name, value):
+        codes = self._codes[name]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+            getattr(self, name).append(value)
+        return code
+
+    def _kill(self, entry_id):
+        row = self._row_of.pop(entry_id, None)
+        if row is not None:
+            self._alive[row] = False
+
+    def _append(self, entry_id, values):
+        """Add a live row with the values from _row()"""
+        row = self._rows
+        size = row + 1
+        self._day = _grow(self._day, size)
+        self._score = _grow(self._score, size)
+        self._emotion = _grow(self._emotion, size)
+        self._mood = _grow(self._mood, size)
+        self._alive = _grow(self._alive, size)
+
+        self._day[row] = values['day']
+        self._score[row] = values['score']
+        self._emotion[row] = self._code('emotions', values['emotion'])
+        self._mood[row] = self._code('moods', values['mood'])
+        self._alive[row] = True
+        self._ids.append(entry_id)
+        self._titles.append(values['title'])
+
+        tags = values['tags']
+        if tags:
+            end = self._tag_pairs + len(tags)
+            self._tag_row = _grow(self._tag_row, end)
+            self._tag_code = _grow(self._tag_code, end)
+            self._tag_row[self._tag_pairs:end] = row
+            self._tag_code[self._tag_pairs:end] = [self._code('tags', tag) for tag in tags]
+            self._tag_pairs = end
+
+        self._row_of[entry_id] = row
+        self._rows = size
+
+    def _compact(self):
+        """Drop dead rows once they make up half the snapshot"""
+        if self._rows < 1024 or len(self._row_of) * 2 > self._rows:
+            return
+        n = self._rows
+        keep = np.flatnonzero(self._alive[:n])
+        new_row = np.full(n, -1, dtype=np.int64)
+        new_row[keep] = np.arange(len(keep))
+
+        pair_rows = self._tag_row[:self._tag_pairs]
+        pair_keep = self._alive[pair_rows]
+        self._tag_row = new_row[pair_rows[pair_keep]].astype(np.int32)
+        self._tag_code = self._tag_code[:self._tag_pairs][pair_keep]
+        self._tag_pairs = len(self._tag_row)
+
+        self._day = self._day[keep]
+        self._score = self._score[keep]
+        self._emotion = self._emotion[keep]
+        self._mood = self._mood[keep]
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._ids = [self._ids[row] for row in keep]
+        self._titles = [self._titles[row] for row in keep]
+        self._row_of = {entry_id: row for row, entry_id in enumerate(self._ids)}
+        self._rows = len(keep)
+
+    def put_many(self, entries):
+        """Add or replace (entry id, entry) pairs; an entry of None removes it"""
+        with self._lock:
+            if not self._built:
+                return
+            records = []
+            for entry_id, entry in entries:
+                row = _row(entry) if entry is not None else None
+                self._kill(entry_id)
+                if row is not None:
+                    self._append(entry_id, row)
+                records.append((entry_id, row))
+            self._compact()
+            self._log(records)
+
+    def put(self, entry_id, entry):
+        self.put_many([(entry_id, entry)])
+
+    def remove_many(self, entry_ids):
+        self.put_many([(entry_id, None) for entry_id in entry_ids])
+
+    def remove(self, entry_id):
+        self.put_many([(entry_id, None)])
+
+    def rebuild(self, entries):
+        """Replace the snapshot with one built from the given entries"""
+        with self._lock:
+            self._reset()
+            for entry in entries:
+                if entry.get('id'):
+                    self._kill(entry['id'])
+                    self._append(entry['id'], _row(entry))
+            self._built = True
+            self._save()
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def _mask(self, filters=None, since_ordinal=None):
+        """Boolean mask of live rows matching get_entries()-style filters"""
+        n = self._rows
+        mask = self._alive[:n].copy()
+        filters = filters or {}
+        if since_ordinal is not None:
+            mask &= self._day[:n] >= since_ordinal
+        if filters.get('start_date'):
+            mask &= self._day[:n] >= date.fromisoformat(str(filters['start_date'])[:10]).toordinal()
+        if filters.get('end_date'):
+            mask &= self._day[:n] <= date.fromisoformat(str(filters['end_date'])[:10]).toordinal()
+        if filters.get('mood'):
+            mask &= self._mood[:n] == self._codes['moods'].get(filters['mood'], -1)
+        if filters.get('emotion'):
+            mask &= self._emotion[:n] == self._codes['emotions'].get(filters['emotion'].lower(), -1)
+        if filters.get('tags'):
+            wanted = [self._codes['tags'][tag] for tag in {t.strip().lower() for t in filters['tags']}
+                      if tag in self._codes['tags']]
+            pairs = np.isin(self._tag_code[:self._tag_pairs], wanted)
+            tagged = np.zeros(n, dtype=bool)
+            tagged[self._tag_row[:self._tag_pairs][pairs]] = True
+            mask &= tagged
+        return mask
+
+    def frame(self, filters=None, since_ordinal=None):
+        """DataFrame of the matching entries, one row per entry, oldest first
+
+        Columns: id, title, day (ordinal), date, sentiment_score, emotion, mood.
+        """
+        with self._lock:
+            rows = np.flatnonzero(self._mask(filters, since_ordinal))
+            rows = rows[np.argsort(self._day[rows], kind='stable')]
+            day = self._day[rows]
+            return pd.DataFrame({
+                'id': [self._ids[row] for row in rows],
+                'title': [self._titles[row] for row in rows],
+                'day': day,
+                'date': pd.to_datetime(day - _EPOCH_ORDINAL, unit='D'),
+                'sentiment_score': self._score[rows],
+                'emotion': np.array(self.emotions, dtype=object)[self._emotion[rows]],
+                'mood': np.array(self.moods, dtype=object)[self._mood[rows]],
+            })
+
+    def __len__(self):
+        with self._lock:
+            return len(self._row_of)
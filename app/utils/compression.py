@@ -0,0 +1,92 @@
+import zlib
+import base64
+
+# Entries whose content is shorter than this are stored as plain text; the
+# compressed form would not be meaningfully smaller
+MIN_COMPRESS_LENGTH = 256
+
+# Preset dictionaries shared by every writer and reader, keyed by the id that
+# is stored with each compressed value. zlib seeds its window with the
+# dictionary, so words that appear in it cost a few bits even in a short
+# entry. The most common strings go last, where they are cheapest to refer to.
+# Never change a published dictionary; add a new id instead.
+DICTIONARIES = {
+    'en1': " ".join("""
+        anxious appreciate birthday breakfast calm career celebrate challenge change coffee
+        colleague conversation dinner dream evening exercise exhausted excited family feeling
+        finally focus friend future goal grateful habit happy health hope idea important
+        journal learning lunch meeting memory mindful morning moment motivated music nervous
+        overwhelmed party peaceful people person plan progress project proud quiet reading
+        realized reflect relationship relaxed remember sad schedule sleep small stress
+        stressed struggle success tired together tomorrow travel trying walk weekend work
+        worried writing yesterday
+        about after again all also always am an and any are around as at back be
+        because been before being better but by can could day did didn't do don't down
+        even every feel feels felt first for from get getting go going good got great
+        had has have he her him his how i i'm if in into is it it's just know last
+        like little lot made make me more most much my need never new next night no
+        not now of off on one only or other our out over really right said same saw
+        see she should so some something still such take than that that's the their
+        them then there these they thing things think this though thought through time
+        to today too took up us very want was way we week well went were what when
+        where which while who why will with without would year you your
+        I feel I felt I think I want I need I was I am I have I had I'm going to
+        it was today I today was this morning this evening a lot of for the first time
+    """.split()).encode('utf-8'),
+}
+
+DEFAULT_DICTIONARY = 'en1'
+
+
+def compress_text(text, dictionary=DEFAULT_DICTIONARY):
+    """Compress a string into a JSON-safe {'codec', 'dict', 'data'} value"""
+    compressor = zlib.compressobj(level=9, zdict=DICTIONARIES[dictionary])
+    data = compressor.compress(text.encode('utf-8')) + compressor.flush()
+    return {'codec': 'zlib', 'dict': dictionary, 'data': base64.b64encode(data).decode('ascii')}
+
+
+def decompress_text(value):
+    """Inverse of compress_text"""
+    if value.get('codec') != 'zlib':
+        raise ValueError(f"Unknown content codec: {value.get('codec')!r}")
+    decompressor = zlib.decompressobj(zdict=DICTIONARIES[value['dict']])
+    data = decompressor.decompress(base64.b64decode(value['data'])) + decompressor.flush()
+    return data.decode('utf-8')
+
+
+def compress_entry(entry, enabled=True, replace=False):
+    """Return a copy of an entry (or update) ready to be stored
+
+    When enabled, long `content` is moved into `content_z`. With replace=True
+    (for updates) both fields are always written, so whichever form was
+    stored before is overwritten.
+    """
+    if 'content' not in entry or entry.get('content_z'):
+        return entry
+    entry = dict(entry)
+    content = entry['content']
+    if enabled and isinstance(content, str) and len(content) >= MIN_COMPRESS_LENGTH:
+        compressed = compress_text(content)
+        # base64 adds a third, so only keep it when it actually saves space
+        if len(compressed['data']) < len(content.encode('utf-8')):
+            entry['content'] = None
+            entry['content_z'] = compressed
+            return entry
+    if replace:
+        entry['content_z'] = None
+    return entry
+
+
+def decompress_entry(entry):
+    """Return an entry with `content` restored from `content_z` if needed"""
+    if 'content_z' not in entry:
+        return entry
+    entry = dict(entry)
+    compressed = entry.pop('content_z')
+    if compressed:
+        try:
+            entry['content'] = decompress_text(compressed)
+        except Exception as e:
+            print(f"Error decompressing entry content: {e}")
+            entry['content'] = ''
+    return entry
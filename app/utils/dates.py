@@ -0,0 +1,75 @@
+from datetime import datetime, date
+
+# Pre-parsed fields written with every entry so pages can sort and bucket on
+# integers instead of parsing ISO strings on every render
+DATE_FIELDS = ['day_ordinal', 'month_key', 'epoch']
+
+
+def _parse_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return None
+
+
+def date_fields(entry):
+    """Compute day_ordinal, month_key and epoch for an entry
+
+    The day comes from `date`, falling back to `timestamp`; epoch seconds
+    come from `timestamp`. Fields that cannot be derived are left out.
+    """
+    fields = {}
+    timestamp = _parse_datetime(entry.get('timestamp'))
+    day = _parse_datetime(entry.get('date')) or timestamp
+
+    if day is not None:
+        fields['day_ordinal'] = day.toordinal()
+        fields['month_key'] = day.strftime("%Y-%m")
+    if timestamp is not None:
+        fields['epoch'] = timestamp.timestamp()
+    return fields
+
+
+def add_date_fields(entry):
+    """Add the pre-parsed date fields to an entry in place"""
+    entry.update(date_fields(entry))
+    return entry
+
+
+def update_date_fields(data):
+    """Pre-parsed fields to store alongside a partial update
+
+    Day fields are only recomputed when the update changes `date`, and epoch
+    only when it changes `timestamp`.
+    """
+    fields = {}
+    if 'date' in data:
+        fields.update({key: value for key, value in date_fields({'date': data['date']}).items()
+                       if key != 'epoch'})
+    if 'timestamp' in data:
+        epoch = date_fields({'timestamp': data['timestamp']}).get('epoch')
+        if epoch is not None:
+            fields['epoch'] = epoch
+    return fields
+
+
+def entry_day_ordinal(entry):
+    """Day ordinal of an entry, parsing the date only for entries saved before the field existed"""
+    ordinal = entry.get('day_ordinal')
+    if ordinal is None:
+        ordinal = date_fields(entry).get('day_ordinal', date.today().toordinal())
+    return ordinal
+
+
+def entry_month_key(entry):
+    """Month key ("YYYY-MM") of an entry"""
+    month_key = entry.get('month_key')
+    if month_key is None:
+        month_key = date.fromordinal(entry_day_ordinal(entry)).strftime("%Y-%m")
+    return month_key
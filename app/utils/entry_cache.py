@@ -0,0 +1,223 @@
+import os
+import json
+import bisect
+import threading
+
+
+class EntryCache:
+    """In-process cache of a JSON entries file.
+
+    Entries are kept in a dict keyed by id together with a sorted
+    (timestamp, id) index. The cache is validated against the file's
+    mtime and size, so reads do no file I/O beyond a stat() unless another
+    process has changed the file.
+    """
+
+    # Indentation of the written file (None writes it compactly)
+    indent = 2
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._signature = None
+        self._by_id = {}
+        self._timestamp_index = []
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def _validate(self):
+        """Reload the file if it changed since it was last read or written"""
+        signature = self._stat_signature()
+        if signature == self._signature:
+            return
+
+        entries = []
+        if signature is not None:
+            try:
+                with open(self.path, 'r') as f:
+                    entries = json.load(f)
+            except Exception as e:
+                print(f"Error reading from local file: {e}")
+                return
+
+        self._by_id = {}
+        for entry in entries:
+            if entry.get('id'):
+                self._by_id[entry['id']] = entry
+        self._timestamp_index = sorted(
+            (self._timestamp_key(entry), entry_id) for entry_id, entry in self._by_id.items()
+        )
+        self._signature = signature
+
+    @staticmethod
+    def _timestamp_key(entry):
+        return str(entry.get('timestamp', ''))
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+    def get(self, entry_id):
+        """Return an entry by id in O(1)"""
+        with self._lock:
+            self._validate()
+            return self._by_id.get(entry_id)
+
+    def get_all(self):
+        """Return all entries in file order"""
+        with self._lock:
+            self._validate()
+            return list(self._by_id.values())
+
+    def sorted_entries(self, order_by='timestamp', descending=True, limit=None, after=None, filters=None):
+        """Return entries sorted by a field, using the timestamp index when possible
+
+        `after` is a (sort key, id) keyset position; only entries strictly
+        after it in the requested order are returned. `filters` is applied
+        with matches_filters().
+        """
+        with self._lock:
+            self._validate()
+            if order_by == 'timestamp':
+                index = self._timestamp_index
+                if descending:
+                    end = bisect.bisect_left(index, tuple(after)) if after else len(index)
+                    positions = range(end - 1, -1, -1)
+                else:
+                    start = bisect.bisect_right(index, tuple(after)) if after else 0
+                    positions = range(start, len(index))
+
+                entries = []
+                for i in positions:
+                    entry = self._by_id[index[i][1]]
+                    if filters and not matches_filters(entry, filters):
+                        continue
+                    entries.append(entry)
+                    if limit and len(entries) >= limit:
+                        break
+                return entries
+
+            entries = list(self._by_id.values())
+
+        return sort_entries(entries, order_by, descending, limit, after, filters)
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+    def put(self, entry):
+        """Insert or replace an entry in the cache"""
+        entry = json.loads(json.dumps(entry, default=str))
+        with self._lock:
+            self._validate()
+            old = self._by_id.get(entry['id'])
+            if old is not None:
+                self._remove_from_index(old)
+            self._by_id[entry['id']] = entry
+            bisect.insort(self._timestamp_index, (self._timestamp_key(entry), entry['id']))
+
+    def update(self, entry_id, data):
+        """Merge fields into a cached entry"""
+        with self._lock:
+            self._validate()
+            entry = self._by_id.get(entry_id)
+            if entry is None:
+                return False
+            entry = dict(entry)
+            entry.update(data)
+            self.put(entry)
+            return True
+
+    def remove(self, entry_id):
+        """Drop an entry from the cache"""
+        with self._lock:
+            self._validate()
+            old = self._by_id.pop(entry_id, None)
+            if old is not None:
+                self._remove_from_index(old)
+            return old is not None
+
+    def _remove_from_index(self, entry):
+        key = (self._timestamp_key(entry), entry['id'])
+        i = bisect.bisect_left(self._timestamp_index, key)
+        if i < len(self._timestamp_index) and self._timestamp_index[i] == key:
+            del self._timestamp_index[i]
+
+    def flush(self):
+        """Write the cached entries back to the file"""
+        with self._lock:
+            with open(self.path, 'w') as f:
+                json.dump(list(self._by_id.values()), f, default=str, indent=self.indent)
+            # Our own write must not trigger a reload on the next read
+            self._signature = self._stat_signature()
+
+
+def project_entry(entry, fields):
+    """Return a copy of an entry with only the given fields and its id"""
+    projected = {field: entry[field] for field in fields if field in entry}
+    if 'id' in entry:
+        projected['id'] = entry['id']
+    return projected
+
+
+def matches_filters(entry, filters):
+    """Check an entry against a get_entries() filter dict
+
+    Supported keys: start_date and end_date (ISO dates, inclusive), mood,
+    emotion (sentiment.emotion, case-insensitive), tags (any of, case-insensitive)
+    and analysis_status.
+    """
+    date = str(entry.get('date', ''))
+    if filters.get('start_date') and date < str(filters['start_date']):
+        return False
+    if filters.get('end_date') and date > str(filters['end_date']):
+        return False
+    if filters.get('mood') and entry.get('mood') != filters['mood']:
+        return False
+    if filters.get('emotion'):
+        sentiment = entry.get('sentiment') or {}
+        if str(sentiment.get('emotion', '')).lower() != filters['emotion'].lower():
+            return False
+    if filters.get('tags'):
+        wanted = {tag.strip().lower() for tag in filters['tags']}
+        if not any(str(tag).strip().lower() in wanted for tag in entry.get('tags', [])):
+            return False
+    if filters.get('analysis_status') and entry.get('analysis_status') != filters['analysis_status']:
+        return False
+    return True
+
+
+def sort_entries(entries, order_by='timestamp', descending=True, limit=None, after=None, filters=None):
+    """Filter and sort a list of entries with an id tie-breaker and apply a keyset position"""
+    if filters:
+        entries = [entry for entry in entries if matches_filters(entry, filters)]
+
+    def sort_key(entry):
+        return (str(entry.get(order_by, '')) if order_by else '', str(entry.get('id', '')))
+
+    entries = sorted(entries, key=sort_key, reverse=descending)
+
+    if after:
+        after = tuple(after)
+        if descending:
+            entries = [entry for entry in entries if sort_key(entry) < after]
+        else:
+            entries = [entry for entry in entries if sort_key(entry) > after]
+
+    return entries[:limit] if limit else entries
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_entry_cache(path):
+    """Return the shared cache for a JSON entries file"""
+    path = os.path.abspath(path)
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = EntryCache(path)
+        return _caches[path]
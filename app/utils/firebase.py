@@ -1,13 +1,36 @@
 import firebase_admin
 from firebase_admin import credentials, firestore
+from google.api_core import exceptions as google_exceptions
 import os
+import re
 import json
-from datetime import datetime
+import time
+import uuid
+import base64
+import hashlib
+import unicodedata
+import threading
+import contextvars
+from datetime import datetime, timedelta, timezone
 import sys
 
 # Add path to ensure imports work correctly
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from app.utils.journal_store import JournalStore
+from app.utils.sqlite_store import SQLiteStore, SORTABLE_COLUMNS
+from app.utils.entry_cache import get_entry_cache, sort_entries, project_entry, matches_filters
+from app.utils.outbox import WriteOutbox, PermanentWriteError
+from app.utils.mirror import FirestoreMirror
+from app.utils.dates import add_date_fields, update_date_fields, DATE_FIELDS
+from app.utils.tags import add_tag_fields, tag_fields, normalize_tags
+from app.utils.stats import (StatsSidecar, STATS_FIELDS, stats_delta, combine_deltas, affects_stats,
+                             apply_delta, build_days, month_of_day, summarize)
+from app.utils.search_index import SearchIndex, SEARCH_FIELDS, affects_search
+from app.utils.compression import compress_entry, decompress_entry
+from app.utils.columns import ColumnarSnapshot, COLUMN_FIELDS, affects_columns
+from app.utils.resilience import CircuitBreaker, is_transient
+
 # Firebase configuration from the provided config
 FIREBASE_CONFIG = {
   "apiKey": "AIzaSyC***********************wdoPz4DQ",
@@ -19,53 +42,575 @@ FIREBASE_CONFIG = {
   "measurementId": "G-**********"
 }
 
+LOCAL_ENTRIES_FILE = 'local_entries.json'
+
+# Entries are partitioned by user. The default user keeps the top-level
+# collections and the files in the working directory; every named user gets
+# Firestore subcollections under users/{user_id} and a directory here
+USER_DATA_DIR = os.environ.get('TIME_CAPSULE_USER_DATA_DIR', 'user_data')
+
+# Running statistics for the local entries (see app/utils/stats.py)
+LOCAL_STATS_FILE = 'entry_stats.json'
+
+# Full-text search indexes for the local entries and for Firestore
+LOCAL_SEARCH_INDEX_FILE = 'search_index.json'
+FIRESTORE_SEARCH_INDEX_FILE = 'firestore_search_index.json'
+
+# Columnar snapshot of the chartable fields of the local entries
+LOCAL_COLUMNS_FILE = 'entry_columns.npz'
+
+# Local storage backend used when Firestore is unavailable:
+#   "json"    - rewrite local_entries.json on every write (default)
+#   "journal" - append-only JSONL log compacted into local_entries.json
+#   "sqlite"  - indexed SQLite database in local_entries.db
+LOCAL_BACKEND = os.environ.get('TIME_CAPSULE_LOCAL_BACKEND', 'json')
+
+# Connect to Firestore at all ("0" to keep every entry in local storage)
+FIRESTORE = os.environ.get('TIME_CAPSULE_FIRESTORE', '1') != '0'
+
+# Seconds to wait for Firestore to answer when connecting in the background;
+# until it does, entries are read and written locally
+FIREBASE_INIT_TIMEOUT = float(os.environ.get('TIME_CAPSULE_FIREBASE_INIT_TIMEOUT', '10'))
+
+# Transient Firestore errors are retried this many times with backoff; after
+# CIRCUIT_FAILURES consecutive failed calls every call goes straight to local
+# storage, and Firestore is probed every CIRCUIT_RESET_SECONDS until it answers
+FIRESTORE_RETRIES = int(os.environ.get('TIME_CAPSULE_FIRESTORE_RETRIES', '2'))
+CIRCUIT_FAILURES = int(os.environ.get('TIME_CAPSULE_CIRCUIT_FAILURES', '3'))
+CIRCUIT_RESET_SECONDS = float(os.environ.get('TIME_CAPSULE_CIRCUIT_RESET_SECONDS', '30'))
+
+# Queue Firestore writes in a durable outbox and apply them in the background
+# instead of blocking the page on the network ("0" to write synchronously)
+WRITE_BEHIND = os.environ.get('TIME_CAPSULE_WRITE_BEHIND', '1') != '0'
+
+# Serve reads from a local mirror of the entries collection kept in sync by a
+# snapshot listener (or by polling every MIRROR_POLL_SECONDS) ("0" to disable)
+MIRROR = os.environ.get('TIME_CAPSULE_MIRROR', '1') != '0'
+MIRROR_POLL_SECONDS = int(os.environ.get('TIME_CAPSULE_MIRROR_POLL_SECONDS', '30'))
+
+# Store long entry content zlib-compressed (with a shared preset dictionary)
+# and decompress it only when a full entry is read ("1" to enable)
+COMPRESS_CONTENT = os.environ.get('TIME_CAPSULE_COMPRESS_CONTENT', '0') == '1'
+
+
+_app_lock = threading.Lock()
+
+
+# Shape of the ids returned by partition_id(); they are used in file paths
+# and Firestore document ids, so nothing else is accepted as a user id
+_PARTITION_ID_RE = re.compile(r'[a-z0-9_-]*[0-9a-f]{16}')
+
+
+def partition_id(name):
+    """Id of the partition for a user name (None for an empty name, the default user)
+    
+    A readable slug of the name followed by a hash of it, so names that
+    slug alike (or not at all, like "李雷") still get separate partitions.
+    Names differing only in case or surrounding whitespace are the same user.
+    """
+    name = ' '.join(unicodedata.normalize('NFC', str(name or '')).casefold().split())
+    if not name:
+        return None
+    slug = re.sub(r'[^a-z0-9_-]+', '_', name).strip('_')[:40]
+    digest = hashlib.sha256(name.encode('utf-8')).hexdigest()[:16]
+    return f"{slug}-{digest}" if slug else digest
+
+
+def _check_partition_id(user_id):
+    if user_id is not None and not _PARTITION_ID_RE.fullmatch(user_id):
+        raise ValueError(f"Not a partition id: {user_id!r} (use partition_id(name))")
+    return user_id
+
+
+def _get_firebase_app():
+    """Return the default Firebase app, initializing it on first use"""
+    with _app_lock:
+        try:
+            # Check if app is already initialized
+            return firebase_admin.get_app()
+        except ValueError:
+            # Initialize with service account if available
+            if os.path.exists('firebase-key.json'):
+                cred = credentials.Certificate('firebase-key.json')
+                return firebase_admin.initialize_app(cred)
+            # For development purposes, we'll use the config directly
+            # In production, use a service account key file
+            return firebase_admin.initialize_app()
+
+
+def _probe_firestore():
+    """Cheapest possible Firestore round trip, used to detect recovery"""
+    firestore.client().collection('entries').limit(1).get(timeout=FIREBASE_INIT_TIMEOUT)
+
+
+# Shared by every user's manager, since an outage affects them all
+firestore_breaker = CircuitBreaker(_probe_firestore, CIRCUIT_FAILURES, CIRCUIT_RESET_SECONDS)
+
+
+def _encode_cursor(entry, order_by):
+    """Build an opaque page token from the last entry of a page"""
+    key = str(entry.get(order_by, '')) if order_by else ''
+    payload = json.dumps([key, str(entry.get('id', ''))])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor):
+    """Return the (sort key, id) keyset position stored in a page token"""
+    try:
+        key, entry_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return (key, entry_id)
+    except Exception:
+        raise ValueError(f"Invalid page cursor: {cursor!r}")
+
+
+def _page_with_cursor(entries, limit, order_by):
+    """Trim a limit+1 result to one page and build the next-page cursor"""
+    if not limit or len(entries) <= limit:
+        return entries, None
+    entries = entries[:limit]
+    return entries, _encode_cursor(entries[-1], order_by)
+
+
+# Firestore commits at most this many writes per batch
+FIRESTORE_BATCH_SIZE = 500
+
+# Writes per entry when the statistics document is updated in the same
+# batch: the entry (plus a tombstone on delete) and up to two stats documents
+# (one more write per batch creates its marker in entry_stats_writes)
+WRITES_PER_ENTRY = 3
+
+# Every batch carrying statistics increments also creates a marker document
+# named after the write in entry_stats_writes, so a retried commit that was
+# already applied fails with AlreadyExists instead of counting twice. Markers
+# carry `expire_at` for a Firestore TTL policy to delete them after this long
+STATS_WRITE_MARKER_DAYS = 7
+
+# Document in the entry_stats collection written once the statistics have
+# been built from the existing entries; until then get_stats() rebuilds them
+# in the background. Statistics built with an older STATS_VERSION are rebuilt
+# as well (version 2 repairs counters that merges of empty maps had cleared)
+STATS_BUILT_MARKER = '_built'
+STATS_VERSION = 2
+
+# Firestore allows at most this many values in an array_contains_any clause,
+# so a tag filter may list at most this many tags
+MAX_ARRAY_CONTAINS_ANY = 10
+
+
+# Fields needed to render entry lists and charts (everything except the
+# full content); pass as `fields=` to get_entries to skip downloading bodies
+SUMMARY_FIELDS = ['title', 'date', 'timestamp', 'mood', 'tags', 'summary', 'sentiment', 'keywords',
+                  'analysis_status'] + DATE_FIELDS
+
+
+# Fields matches_filters() looks at
+FILTER_FIELDS = ['date', 'mood', 'sentiment', 'tags', 'analysis_status']
+
+# Search hits are fetched this many at a time when every match is ranked
+SEARCH_FETCH_SIZE = 100
+
+
+def _chunks(items, size):
+    """Split a list into consecutive slices of at most `size` items"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _page_from_cache(cache, limit, order_by, descending, cursor, filters, fields):
+    """Read one page from an EntryCache (local JSON file or Firestore mirror)"""
+    after = _decode_cursor(cursor) if cursor else None
+    entries = cache.sorted_entries(order_by, descending, limit + 1 if limit else None, after, filters)
+    entries, next_cursor = _page_with_cursor(entries, limit, order_by)
+    if fields:
+        entries = [project_entry(entry, fields) for entry in entries]
+    return entries, next_cursor
+
+
+def _apply_firestore_filters(query, filters, order_by, direction):
+    """Translate a get_entries() filter dict into Firestore where clauses"""
+    if filters.get('mood'):
+        query = query.where('mood', '==', filters['mood'])
+    
+    if filters.get('emotion'):
+        query = query.where('sentiment.emotion', '==', filters['emotion'].lower())
+    
+    if filters.get('tags'):
+        # Firestore compares array values exactly, so match the lowercased copy
+        query = query.where('tags_lower', 'array_contains_any', normalize_tags(filters['tags']))
+    
+    if filters.get('analysis_status'):
+        query = query.where('analysis_status', '==', filters['analysis_status'])
+    
+    if filters.get('start_date') or filters.get('end_date'):
+        if filters.get('start_date'):
+            query = query.where('date', '>=', str(filters['start_date']))
+        if filters.get('end_date'):
+            query = query.where('date', '<=', str(filters['end_date']))
+        # A range filter requires the first ordering to be on the same field
+        if order_by != 'date':
+            query = query.order_by('date', direction=direction)
+    
+    return query
+
 
 class FirebaseManager:
-    _instance = None
+    # One manager per user partition, each with its own caches and indexes
+    _instances = {}
+    _instances_lock = threading.Lock()
     
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(FirebaseManager, cls).__new__(cls)
-            cls._instance._initialize()
-        return cls._instance
+    def __new__(cls, user_id=None):
+        """Manager for a partition id from partition_id() (None for the default user)"""
+        user_id = _check_partition_id(user_id)
+        with cls._instances_lock:
+            instance = cls._instances.get(user_id)
+            if instance is None:
+                instance = super(FirebaseManager, cls).__new__(cls)
+                instance._initialize(user_id)
+                cls._instances[user_id] = instance
+        return instance
     
-    def _initialize(self):
-        """Initialize Firebase connection"""
+    def _initialize(self, user_id=None):
+        """Set up local storage and start connecting to Firestore"""
         self.app = None
         self.db = None
         self.is_available = False
+        self.user_id = user_id
+        self.data_dir = os.path.join(USER_DATA_DIR, user_id) if user_id else ''
+        if self.data_dir:
+            os.makedirs(self.data_dir, exist_ok=True)
+        self.local_store = self._create_local_store()
+        self.local_cache = get_entry_cache(self._path(LOCAL_ENTRIES_FILE))
+        if COMPRESS_CONTENT:
+            # Indentation would undo a good part of the savings
+            self.local_cache.indent = None
+        self.local_stats = StatsSidecar(self._path(LOCAL_STATS_FILE))
+        self.local_index = SearchIndex(self._path(LOCAL_SEARCH_INDEX_FILE))
+        self.local_columns = ColumnarSnapshot(self._path(LOCAL_COLUMNS_FILE))
+        self.remote_index = None
+        self.remote_columns = None
+        self.outbox = None
+        self.write_behind = False
+        self.mirror = None
+        self._stats_rebuild = None
+        self._stats_rebuild_lock = threading.Lock()
         
-        try:
-            # Check if app is already initialized
-            self.app = firebase_admin.get_app()
-        except ValueError:
-            # Initialize with service account if available
+        # Local writes made until Firestore is connected are also queued in
+        # the outbox, which is only started once it is (see _queue_local_write).
+        # Held while switching over, so no local write is left out of both.
+        self.sync_local_writes = FIRESTORE
+        self._connect_lock = threading.RLock()
+        if FIRESTORE:
             try:
-                if os.path.exists('firebase-key.json'):
-                    cred = credentials.Certificate('firebase-key.json')
-                    self.app = firebase_admin.initialize_app(cred)
-                else:
-                    # For development purposes, we'll use the config directly
-                    # In production, use a service account key file
-                    self.app = firebase_admin.initialize_app()
+                self.outbox = WriteOutbox(self._path('firestore_outbox.jsonl'))
             except Exception as e:
-                print(f"Error initializing Firebase: {e}")
-                return
+                print(f"Error opening write outbox: {e}")
+        
+        # Firestore is connected in the background so the first page renders
+        # from local storage instead of waiting on the credential lookup.
+        # `ready` is set once the attempt has finished, successfully or not.
+        self.ready = threading.Event()
+        if FIRESTORE:
+            threading.Thread(target=self._connect, name='firebase-connect', daemon=True).start()
+        else:
+            self.ready.set()
+    
+    def _connect(self):
+        """Connect to Firestore; entries are stored locally until this succeeds"""
+        try:
+            self.app = _get_firebase_app()
+        except Exception as e:
+            print(f"Error initializing Firebase: {e}")
+            self._stop_syncing_local_writes()
+            self.ready.set()
+            return
         
         try:
             self.db = firestore.client()
-            self.is_available = True
+            # Only switch over once Firestore has actually answered; while it
+            # is unreachable keep serving locally and try again periodically
+            while True:
+                try:
+                    self.collection('entries').limit(1).get(timeout=FIREBASE_INIT_TIMEOUT)
+                    break
+                except Exception as e:
+                    if not is_transient(e):
+                        raise
+                    print(f"Firestore not reachable yet, retrying in {CIRCUIT_RESET_SECONDS:.0f}s: {e}")
+                    self.ready.set()
+                    time.sleep(CIRCUIT_RESET_SECONDS)
+            
+            if self.outbox is not None:
+                # Replays the writes queued before connecting, by this
+                # session or by one that ended before they were applied
+                self.outbox.start(self._send_outbox_record)
+                if not WRITE_BEHIND:
+                    # Later writes are committed directly, after the queued ones
+                    self.outbox.flush()
+                self.write_behind = WRITE_BEHIND
+            
+            self.remote_index = SearchIndex(self._path(FIRESTORE_SEARCH_INDEX_FILE))
+            # Rebuilt from the mirror (or Firestore) the first time a chart needs it
+            self.remote_columns = ColumnarSnapshot()
+            
+            if MIRROR:
+                self.mirror = FirestoreMirror(
+                    self.collection('entries'),
+                    self.collection('entry_tombstones'),
+                    path=self._path('firestore_mirror.json'),
+                    poll_interval=MIRROR_POLL_SECONDS,
+                    on_change=self._index_mirror_change,
+                    pending_ids=self.outbox.pending_ids if self.outbox is not None else None
+                )
+                if COMPRESS_CONTENT:
+                    self.mirror.cache.indent = None
+                # Index a mirror persisted before the index existed; from
+                # here on the mirror reports every change
+                if not self.remote_index.exists():
+                    self.remote_index.rebuild(self.mirror.cache.get_all())
+                if self.outbox is not None:
+                    # Show queued writes before Firestore has them
+                    for op, entry_id, data in self.outbox.pending_writes():
+                        self._mirror_write(op, entry_id, data)
+                self.mirror.start()
+            
+            with self._connect_lock:
+                self.is_available = True
+                # Writes go to Firestore from here on; local ones are fallbacks
+                self.sync_local_writes = False
             print("Firebase initialized successfully")
         except Exception as e:
             print(f"Firebase Firestore not available: {e}")
             print("The application will run in demo mode with local storage.")
             self.is_available = False
+            self._stop_syncing_local_writes()
+        finally:
+            self.ready.set()
+    
+    def _stop_syncing_local_writes(self):
+        """Stay local for good: stop queueing local writes and drop the ones queued so far"""
+        with self._connect_lock:
+            self.sync_local_writes = False
+        if self.outbox is not None:
+            try:
+                self.outbox.discard_local()
+            except Exception as e:
+                print(f"Error clearing queued local writes: {e}")
+    
+    def wait_ready(self, timeout=None):
+        """Wait for the Firestore connection attempt; returns whether Firestore is in use
+        
+        Waits at most FIREBASE_INIT_TIMEOUT seconds unless `timeout` is given.
+        """
+        if not self.ready.wait(FIREBASE_INIT_TIMEOUT if timeout is None else timeout):
+            print("Firestore is still connecting; using local storage for now")
+        return self.is_available
+    
+    def _call(self, fn):
+        """Run a Firestore call with retries, through the shared circuit breaker
+        
+        fn is retried after ambiguous errors too, so it must be safe to
+        repeat (writes here use client-side ids and stats write markers).
+        Raises CircuitOpenError at once while Firestore is down, so the
+        caller's local fallback runs without waiting on a timeout.
+        """
+        return firestore_breaker.call(fn, retries=FIRESTORE_RETRIES)
+    
+    def _path(self, filename):
+        """Path of a local file in this user's partition"""
+        return os.path.join(self.data_dir, filename)
+    
+    def collection(self, name):
+        """Firestore collection `name` in this user's partition"""
+        if self.user_id is None:
+            return self.db.collection(name)
+        return self.db.collection('users').document(self.user_id).collection(name)
+    
+    def _write_document(self, op, entry_id, data=None, batch=None):
+        """Apply a set/update/delete to an entry document, directly or in a batch
+        
+        Every write stamps `updated_at` and every delete leaves a tombstone so
+        the mirror can pick up changes with delta queries.
+        """
+        entry_ref = self.collection('entries').document(entry_id)
+        if op in ('set', 'update'):
+            data = dict(data)
+            data['updated_at'] = firestore.SERVER_TIMESTAMP
+            if batch is not None:
+                getattr(batch, op)(entry_ref, data)
+            else:
+                getattr(entry_ref, op)(data)
+        elif op == 'delete':
+            tombstone_ref = self.collection('entry_tombstones').document(entry_id)
+            tombstone = {'deleted_at': firestore.SERVER_TIMESTAMP}
+            if batch is not None:
+                batch.delete(entry_ref)
+                batch.set(tombstone_ref, tombstone)
+            else:
+                entry_ref.delete()
+                tombstone_ref.set(tombstone)
+    
+    def _write_stats(self, delta, batch):
+        """Add a statistics delta to a batch as increments on the per-month stats documents"""
+        months = {}
+        for day, bucket in delta.items():
+            changes = {
+                'count': firestore.Increment(bucket.get('count', 0)),
+                'sentiment_sum': firestore.Increment(bucket.get('sentiment_sum', 0.0)),
+            }
+            for name in ('emotions', 'tags', 'keywords'):
+                # Empty keys (in writes queued by older versions) would make the commit fail
+                counts = {key: firestore.Increment(value) for key, value in bucket.get(name, {}).items() if key}
+                # A merge replaces the stored map with an empty one, so leave those out
+                if counts:
+                    changes[name] = counts
+            months.setdefault(month_of_day(day), {})[day] = changes
+        for month, days in months.items():
+            batch.set(self.collection('entry_stats').document(month), {'days': days}, merge=True)
+    
+    def _commit_write(self, op, entry_id, data=None, stats=None, write_id=None):
+        """Write an entry and its statistics delta atomically"""
+        if not stats:
+            self._call(lambda: self._write_document(op, entry_id, data))
+            return
+        batch = self.db.batch()
+        self._write_document(op, entry_id, data, batch)
+        self._write_stats(stats, batch)
+        self._commit_stats_batch(batch, write_id)
+    
+    def _commit_stats_batch(self, batch, write_id=None):
+        """Commit a batch carrying statistics increments so they are applied exactly once
+        
+        Pass the same `write_id` when the same write is committed again
+        (e.g. replayed from the outbox); a new one is generated otherwise.
+        """
+        marker = self.collection('entry_stats_writes').document(write_id or uuid.uuid4().hex)
+        batch.create(marker, {'expire_at': datetime.now(timezone.utc) + timedelta(days=STATS_WRITE_MARKER_DAYS)})
+        try:
+            # Safe to retry after an ambiguous error: a repeat finds the marker
+            self._call(batch.commit)
+        except google_exceptions.AlreadyExists:
+            # An earlier attempt was applied but its response was lost
+            pass
+    
+    def _mirror_write(self, op, entry_id, data=None):
+        """Apply a local write to the mirror so it is visible before the listener reports it"""
+        if self.mirror is None:
+            self._index_write(op, entry_id, data)
+            return
+        if op == 'set':
+            self.mirror.apply_document(entry_id, data, local=True)
+        elif op == 'update':
+            self.mirror.apply_update(entry_id, data)
+        elif op == 'delete':
+            self.mirror.remove_document(entry_id)
+    
+    def _index_mirror_change(self, entry_id, entry):
+        """Keep the Firestore search index and columns in step with the mirror"""
+        self.remote_index.put(entry_id, entry)
+        self.remote_columns.put(entry_id, entry)
+    
+    def _index_write(self, op, entry_id, data=None):
+        """Apply a Firestore write to the search index and columns when there is no mirror"""
+        # Views that are not built yet are skipped; they are built from
+        # Firestore the first time they are used
+        views = [(view, affects) for view, affects in ((self.remote_index, affects_search),
+                                                       (self.remote_columns, affects_columns))
+                 if view is not None and view.exists()]
+        if op == 'update':
+            views = [(view, affects) for view, affects in views if affects(data)]
+            if views:
+                data = self._get_stored_entry(entry_id)
+        for view, _ in views:
+            if op == 'delete':
+                view.remove(entry_id)
+            else:
+                view.put(entry_id, data)
+    
+    def _index_local(self, entries):
+        """Add (entry id, entry) pairs to the local search index and columns"""
+        entries = list(entries)
+        self.local_index.put_many(entries)
+        self.local_columns.put_many(entries)
+    
+    def _unindex_local(self, entry_ids):
+        self.local_index.remove_many(entry_ids)
+        self.local_columns.remove_many(entry_ids)
+    
+    def _send_outbox_record(self, record):
+        """Apply one queued write to Firestore (called by the outbox worker)"""
+        try:
+            stats = record.get('stats')
+            if record.get('defer_stats'):
+                stats = self._replay_stats_delta(record)
+            self._commit_write(record['op'], record['id'], record['data'], stats, record.get('write_id'))
+        except (google_exceptions.NotFound, google_exceptions.InvalidArgument, ValueError, TypeError) as e:
+            # Retrying cannot fix these, e.g. updating a deleted document or
+            # data the client library rejects before sending it
+            raise PermanentWriteError(e)
+    
+    def _replay_stats_delta(self, record):
+        """Statistics delta of a queued update or delete, from the entry now in Firestore
+        
+        For writes queued while the old version could not be read; the
+        writes queued before it for the same entry have been applied by now.
+        """
+        if record['op'] == 'update' and not affects_stats(record['data']):
+            return {}
+        doc = self._call(self.collection('entries').document(record['id']).get)
+        if not doc.exists:
+            return {}
+        old = doc.to_dict()
+        if record['op'] == 'update':
+            return stats_delta(old, dict(old, **record['data']))
+        return stats_delta(old, None)
+    
+    def _queue_local_write(self, op, entry_id, data=None):
+        """Queue a write made in local storage for Firestore, if it is still connecting
+        
+        Updates and deletes are only queued for entries that are queued
+        themselves; other local entries do not exist in Firestore.
+        """
+        if not self.sync_local_writes or self.outbox is None:
+            return
+        try:
+            if op == 'set':
+                data = {key: value for key, value in data.items() if key != 'id'}
+                data.setdefault('timestamp', datetime.now())
+                stats = stats_delta(None, data)
+            else:
+                old = self.outbox.apply_pending(entry_id, None)
+                if old is None:
+                    return
+                if op == 'update':
+                    stats = self._update_stats_delta(entry_id, data, lambda _: old)
+                else:
+                    stats = stats_delta(old, None)
+            self.outbox.enqueue(op, entry_id, data, stats, local=True)
+        except Exception as e:
+            print(f"Error queueing local write for Firestore: {e}")
+    
+    def _create_local_store(self):
+        """Create the configured local store (None means the plain JSON file)"""
+        if LOCAL_BACKEND == 'journal':
+            try:
+                return JournalStore(snapshot_path=self._path(LOCAL_ENTRIES_FILE),
+                                    log_path=self._path('local_entries.jsonl'))
+            except Exception as e:
+                print(f"Error opening local journal, using JSON file instead: {e}")
+        elif LOCAL_BACKEND == 'sqlite':
+            try:
+                return SQLiteStore(db_path=self._path('local_entries.db'),
+                                   import_path=self._path(LOCAL_ENTRIES_FILE))
+            except Exception as e:
+                print(f"Error opening SQLite database, using JSON file instead: {e}")
+        return None
     
     def add_entry(self, entry_data):
         """Add a new diary entry to Firestore"""
-        if not self.is_available:
-            # Demo mode: store in memory or local file
-            return self._add_entry_local(entry_data)
+        with self._connect_lock:
+            if not self.is_available:
+                # Demo mode: store in memory or local file
+                return self._add_entry_local(entry_data)
             
         if not self.db:
             print("Firebase not initialized")
@@ -74,12 +619,23 @@ class FirebaseManager:
         # Add timestamp if not provided
         if 'timestamp' not in entry_data:
             entry_data['timestamp'] = datetime.now()
+        
+        # Store pre-parsed date fields alongside the ISO strings
+        add_date_fields(entry_data)
+        add_tag_fields(entry_data)
+        entry_data = compress_entry(entry_data, COMPRESS_CONTENT)
             
         try:
-            # Add entry to the 'entries' collection
-            entry_ref = self.db.collection('entries').document()
-            entry_ref.set(entry_data)
-            return entry_ref.id
+            # Add entry to the 'entries' collection; the document ID is
+            # generated client-side so a queued write can be replayed safely
+            entry_id = self.collection('entries').document().id
+            stats = stats_delta(None, entry_data)
+            if self.write_behind:
+                self.outbox.enqueue('set', entry_id, entry_data, stats)
+            else:
+                self._commit_write('set', entry_id, entry_data, stats)
+            self._mirror_write('set', entry_id, entry_data)
+            return entry_id
         except Exception as e:
             print(f"Error adding entry to Firestore: {e}")
             # Fallback to local storage
@@ -87,104 +643,158 @@ class FirebaseManager:
     
     def _add_entry_local(self, entry_data):
         """Store entry locally when Firestore is not available"""
+        add_date_fields(entry_data)
+        add_tag_fields(entry_data)
+        entry_data = compress_entry(entry_data, COMPRESS_CONTENT)
+        
+        if self.local_store is not None:
+            try:
+                entry_id = self.local_store.add(entry_data)
+            except Exception as e:
+                print(f"Error saving to local store: {e}")
+                return None
+            self.local_stats.apply(stats_delta(None, entry_data))
+            self._index_local([(entry_id, entry_data)])
+            self._queue_local_write('set', entry_id, entry_data)
+            return entry_id
+        
         # Generate a simple ID
-        import uuid
         entry_id = str(uuid.uuid4())
         
         # Add ID to the data
         entry_data['id'] = entry_id
         
-        # Store in memory (this will be lost when the app restarts)
-        if not hasattr(self, 'local_entries'):
-            self.local_entries = []
-        
-        self.local_entries.append(entry_data)
-        
-        # Optionally save to a local JSON file
+        # Save to the local JSON file through the shared cache
         try:
-            local_file = 'local_entries.json'
-            if os.path.exists(local_file):
-                with open(local_file, 'r') as f:
-                    entries = json.load(f)
-            else:
-                entries = []
-            
-            entries.append(entry_data)
-            
-            with open(local_file, 'w') as f:
-                # Convert datetime objects to strings
-                json.dump(entries, f, default=str, indent=2)
+            self.local_cache.put(entry_data)
+            self.local_cache.flush()
+            self.local_stats.apply(stats_delta(None, entry_data))
+            self._index_local([(entry_id, entry_data)])
+            self._queue_local_write('set', entry_id, entry_data)
         except Exception as e:
             print(f"Error saving to local file: {e}")
         
         return entry_id
     
-    def get_entries(self, limit=50, order_by='timestamp', descending=True):
+    def get_entries(self, limit=50, order_by='timestamp', descending=True, cursor=None, filters=None, fields=None):
         """Get diary entries from Firestore"""
+        entries, _ = self.get_entries_page(limit, order_by, descending, cursor, filters, fields)
+        return entries
+    
+    def get_entries_page(self, limit=50, order_by='timestamp', descending=True, cursor=None, filters=None,
+                         fields=None):
+        """Get one page of diary entries and the cursor for the next page
+        
+        The returned cursor is None when there are no more entries. `filters`
+        may contain start_date, end_date, mood, emotion, tags and analysis_status; they are
+        applied by the backend so only matching entries are read. `fields`
+        limits each entry to the given fields plus its id (see SUMMARY_FIELDS).
+        At most MAX_ARRAY_CONTAINS_ANY tags can be filtered on; more raise ValueError.
+        """
+        if filters and len(normalize_tags(filters.get('tags'))) > MAX_ARRAY_CONTAINS_ANY:
+            raise ValueError(f"Filter on at most {MAX_ARRAY_CONTAINS_ANY} tags at a time")
+        
+        if fields and 'content' not in fields:
+            # Nothing to decompress for list views
+            return self._get_stored_entries_page(limit, order_by, descending, cursor, filters, fields)
+        
+        if fields:
+            fields = list(fields) + ['content_z']
+        entries, next_cursor = self._get_stored_entries_page(limit, order_by, descending, cursor, filters, fields)
+        return [decompress_entry(entry) for entry in entries], next_cursor
+    
+    def _get_stored_entries_page(self, limit=50, order_by='timestamp', descending=True, cursor=None, filters=None,
+                                 fields=None):
+        """get_entries_page() returning entries as stored (content may be compressed)"""
         if not self.is_available:
             # Demo mode: return from memory or local file
-            return self._get_entries_local(limit, order_by, descending)
+            return self._get_entries_local(limit, order_by, descending, cursor, filters, fields)
             
         if not self.db:
             print("Firebase not initialized")
-            return []
+            return [], None
+        
+        if self.mirror is not None and self.mirror.ready.is_set():
+            # Served from the local mirror without a network round trip
+            return _page_from_cache(self.mirror.cache, limit, order_by, descending, cursor, filters, fields)
         
         try:    
             # Query entries collection
-            query = self.db.collection('entries')
+            query = self.collection('entries')
+            
+            direction = firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING
+            
+            # Apply filters (see firestore.indexes.json for the composite indexes)
+            if filters:
+                query = _apply_firestore_filters(query, filters, order_by, direction)
             
             # Apply ordering
             if order_by:
-                direction = firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING
                 query = query.order_by(order_by, direction=direction)
             
-            # Apply limit
+            # Continue after the last document of the previous page
+            if cursor:
+                _, last_id = _decode_cursor(cursor)
+                last_doc = self._call(self.collection('entries').document(last_id).get)
+                if last_doc.exists:
+                    query = query.start_after(last_doc)
+            
+            # Only download the requested fields (the sort field is needed for the cursor)
+            if fields:
+                query = query.select(list(dict.fromkeys(list(fields) + ([order_by] if order_by else []))))
+            
+            # Apply limit, fetching one extra document to detect a next page
             if limit:
-                query = query.limit(limit)
+                query = query.limit(limit + 1)
                 
             # Execute query
-            entries = []
-            for doc in query.stream():
-                entry = doc.to_dict()
-                entry['id'] = doc.id
-                entries.append(entry)
+            def fetch():
+                entries = []
+                for doc in query.stream():
+                    entry = doc.to_dict()
+                    entry['id'] = doc.id
+                    entries.append(entry)
+                return entries
+            entries = self._call(fetch)
                 
-            return entries
+            return _page_with_cursor(entries, limit, order_by)
         except Exception as e:
             print(f"Error getting entries from Firestore: {e}")
             # Fallback to local storage
-            return self._get_entries_local(limit, order_by, descending)
+            return self._get_entries_local(limit, order_by, descending, cursor, filters, fields)
     
-    def _get_entries_local(self, limit=50, order_by='timestamp', descending=True):
+    def _get_entries_local(self, limit=50, order_by='timestamp', descending=True, cursor=None, filters=None,
+                           fields=None):
         """Get entries from local storage when Firestore is not available"""
-        entries = []
-        
-        # First check memory
-        if hasattr(self, 'local_entries'):
-            entries = self.local_entries
+        after = _decode_cursor(cursor) if cursor else None
+        fetch_limit = limit + 1 if limit else None
         
-        # Then check local file
-        if not entries:
-            try:
-                local_file = 'local_entries.json'
-                if os.path.exists(local_file):
-                    with open(local_file, 'r') as f:
-                        entries = json.load(f)
-            except Exception as e:
-                print(f"Error reading from local file: {e}")
+        if isinstance(self.local_store, SQLiteStore) and (order_by is None or order_by in SORTABLE_COLUMNS):
+            # Let the database sort, page, limit and project using its indexes
+            # (the sort field is kept for the cursor)
+            if fields and order_by:
+                fields = list(dict.fromkeys(list(fields) + [order_by]))
+            entries = self.local_store.query(fetch_limit, order_by, descending, after=after, fields=fields,
+                                             **(filters or {}))
+            return _page_with_cursor(entries, limit, order_by)
         
-        # Sort entries
-        if order_by and entries:
-            entries.sort(key=lambda x: x.get(order_by, ''), reverse=descending)
+        if self.local_store is None:
+            # Served from the cache; the file is only re-read when it changes
+            return _page_from_cache(self.local_cache, limit, order_by, descending, cursor, filters, fields)
         
-        # Apply limit
-        if limit and len(entries) > limit:
-            entries = entries[:limit]
-            
-        return entries
+        entries = sort_entries(self.local_store.get_all(), order_by, descending, fetch_limit, after, filters)
+        entries, next_cursor = _page_with_cursor(entries, limit, order_by)
+        if fields:
+            entries = [project_entry(entry, fields) for entry in entries]
+        return entries, next_cursor
     
     def get_entry(self, entry_id):
         """Get a specific entry by ID"""
+        entry = self._get_stored_entry(entry_id)
+        return decompress_entry(entry) if entry is not None else None
+    
+    def _get_stored_entry(self, entry_id):
+        """get_entry() returning the entry as stored (content may be compressed)"""
         if not self.is_available:
             # Demo mode: get from memory or local file
             return self._get_entry_local(entry_id)
@@ -194,52 +804,108 @@ class FirebaseManager:
             return None
         
         try:
-            doc = self.db.collection('entries').document(entry_id).get()
-            if doc.exists:
-                entry = doc.to_dict()
-                entry['id'] = doc.id
-                return entry
-            return None
+            if self.mirror is not None and self.mirror.ready.is_set():
+                entry = self.mirror.cache.get(entry_id)
+                entry = dict(entry) if entry is not None else None
+            else:
+                doc = self._call(self.collection('entries').document(entry_id).get)
+                entry = None
+                if doc.exists:
+                    entry = doc.to_dict()
+                    entry['id'] = doc.id
+            if self.outbox is not None:
+                # Reflect writes that are still waiting in the outbox
+                entry = self.outbox.apply_pending(entry_id, entry)
+            return entry
         except Exception as e:
             print(f"Error getting entry from Firestore: {e}")
             # Fallback to local storage
             return self._get_entry_local(entry_id)
     
-    def _get_entry_local(self, entry_id):
-        """Get a specific entry from local storage"""
-        # Check memory
-        if hasattr(self, 'local_entries'):
-            for entry in self.local_entries:
-                if entry.get('id') == entry_id:
-                    return entry
+    def _get_stored_entries_by_id(self, entry_ids, fields=None):
+        """Several entries as stored, fetched together, as {id: entry} (missing ones are left out)
+        
+        `fields` limits each entry to the given fields plus its id; on
+        Firestore only those fields are downloaded.
+        """
+        if not self.is_available:
+            return self._get_entries_by_id_local(entry_ids, fields)
+            
+        if not self.db:
+            print("Firebase not initialized")
+            return {}
         
-        # Check local file
         try:
-            local_file = 'local_entries.json'
-            if os.path.exists(local_file):
-                with open(local_file, 'r') as f:
-                    entries = json.load(f)
-                
-                for entry in entries:
-                    if entry.get('id') == entry_id:
-                        return entry
+            return self._read_stored_entries(entry_ids, fields)
         except Exception as e:
-            print(f"Error reading from local file: {e}")
+            print(f"Error getting entries from Firestore: {e}")
+            # Fallback to local storage
+            return self._get_entries_by_id_local(entry_ids, fields)
+    
+    def _read_stored_entries(self, entry_ids, fields=None):
+        """_get_stored_entries_by_id() without the local fallback; raises when Firestore fails
         
-        return None
+        Used for the old versions behind statistics deltas, where a stale
+        local copy would be counted into Firestore for good.
+        """
+        if self.mirror is not None and self.mirror.ready.is_set():
+            entries = {entry_id: self.mirror.cache.get(entry_id) for entry_id in entry_ids}
+        else:
+            # One batched read instead of a round trip per entry
+            refs = [self.collection('entries').document(entry_id) for entry_id in entry_ids]
+            docs = self._call(lambda: list(self.db.get_all(refs, field_paths=fields)))
+            entries = {doc.id: dict(doc.to_dict(), id=doc.id) for doc in docs if doc.exists}
+        if self.outbox is not None:
+            # Reflect writes that are still waiting in the outbox
+            entries = {entry_id: self.outbox.apply_pending(entry_id, entries.get(entry_id))
+                       for entry_id in entry_ids}
+        return {entry_id: project_entry(entry, fields) if fields else dict(entry)
+                for entry_id, entry in entries.items() if entry is not None}
+    
+    def _read_stored_entry(self, entry_id):
+        """Old version of one entry for a statistics delta (see _read_stored_entries)"""
+        return self._read_stored_entries([entry_id], STATS_FIELDS).get(entry_id)
+    
+    def _get_entries_by_id_local(self, entry_ids, fields=None):
+        entries = {entry_id: self._get_entry_local(entry_id) for entry_id in entry_ids}
+        return {entry_id: project_entry(entry, fields) if fields else dict(entry)
+                for entry_id, entry in entries.items() if entry is not None}
+    
+    def _get_entry_local(self, entry_id):
+        """Get a specific entry from local storage"""
+        if self.local_store is not None:
+            return self.local_store.get(entry_id)
+        
+        return self.local_cache.get(entry_id)
     
     def update_entry(self, entry_id, data):
         """Update an existing entry"""
-        if not self.is_available:
-            # Demo mode: update in memory or local file
-            return self._update_entry_local(entry_id, data)
+        data = dict(data, **update_date_fields(data), **tag_fields(data))
+        data = compress_entry(data, COMPRESS_CONTENT, replace=True)
+        
+        with self._connect_lock:
+            if not self.is_available:
+                # Demo mode: update in memory or local file
+                return self._update_entry_local(entry_id, data)
             
         if not self.db:
             print("Firebase not initialized")
             return False
         
         try:
-            self.db.collection('entries').document(entry_id).update(data)
+            try:
+                stats = self._update_stats_delta(entry_id, data, self._read_stored_entry)
+            except Exception as e:
+                if not self.write_behind:
+                    raise
+                # Worked out from Firestore when the write is replayed
+                print(f"Could not read entry for its statistics, deferring them: {e}")
+                stats = None
+            if self.write_behind:
+                self.outbox.enqueue('update', entry_id, data, stats, defer_stats=stats is None)
+            else:
+                self._commit_write('update', entry_id, data, stats)
+            self._mirror_write('update', entry_id, data)
             return True
         except Exception as e:
             print(f"Error updating entry in Firestore: {e}")
@@ -248,46 +914,77 @@ class FirebaseManager:
     
     def _update_entry_local(self, entry_id, data):
         """Update an entry in local storage"""
-        # Update in memory
-        if hasattr(self, 'local_entries'):
-            for i, entry in enumerate(self.local_entries):
-                if entry.get('id') == entry_id:
-                    self.local_entries[i].update(data)
-                    break
+        stats = self._update_stats_delta(entry_id, data, self._get_entry_local)
+        
+        if self.local_store is not None:
+            try:
+                updated = self.local_store.update(entry_id, data)
+            except Exception as e:
+                print(f"Error updating entry in local store: {e}")
+                return False
+            if updated:
+                self.local_stats.apply(stats)
+                self._index_local_updates([(entry_id, data)])
+                self._queue_local_write('update', entry_id, data)
+            return updated
         
-        # Update in local file
         try:
-            local_file = 'local_entries.json'
-            if os.path.exists(local_file):
-                with open(local_file, 'r') as f:
-                    entries = json.load(f)
-                
-                for i, entry in enumerate(entries):
-                    if entry.get('id') == entry_id:
-                        entries[i].update(data)
-                        break
-                
-                with open(local_file, 'w') as f:
-                    json.dump(entries, f, default=str, indent=2)
-                    
+            if self.local_cache.update(entry_id, data):
+                self.local_cache.flush()
+                self.local_stats.apply(stats)
+                self._index_local_updates([(entry_id, data)])
+                self._queue_local_write('update', entry_id, data)
                 return True
         except Exception as e:
             print(f"Error updating entry in local file: {e}")
         
         return False
     
+    def _index_local_updates(self, updates):
+        """Refresh the local search index and columns for updated entries"""
+        searched = [entry_id for entry_id, data in updates if affects_search(data)]
+        charted = [entry_id for entry_id, data in updates if affects_columns(data)]
+        entries = {entry_id: self._get_entry_local(entry_id) for entry_id in set(searched + charted)}
+        if searched:
+            self.local_index.put_many((entry_id, entries[entry_id]) for entry_id in searched)
+        if charted:
+            self.local_columns.put_many((entry_id, entries[entry_id]) for entry_id in charted)
+    
+    def _update_stats_delta(self, entry_id, data, get_entry):
+        """Statistics change caused by updating an entry (reads it only if needed)"""
+        if not affects_stats(data):
+            return {}
+        old = get_entry(entry_id)
+        if old is None:
+            return {}
+        return stats_delta(old, dict(old, **data))
+    
     def delete_entry(self, entry_id):
         """Delete an entry"""
-        if not self.is_available:
-            # Demo mode: delete from memory or local file
-            return self._delete_entry_local(entry_id)
+        with self._connect_lock:
+            if not self.is_available:
+                # Demo mode: delete from memory or local file
+                return self._delete_entry_local(entry_id)
             
         if not self.db:
             print("Firebase not initialized")
             return False
         
         try:
-            self.db.collection('entries').document(entry_id).delete()
+            try:
+                old = self._read_stored_entry(entry_id)
+                stats = stats_delta(old, None) if old is not None else {}
+            except Exception as e:
+                if not self.write_behind:
+                    raise
+                # Worked out from Firestore when the write is replayed
+                print(f"Could not read entry for its statistics, deferring them: {e}")
+                stats = None
+            if self.write_behind:
+                self.outbox.enqueue('delete', entry_id, stats=stats, defer_stats=stats is None)
+            else:
+                self._commit_write('delete', entry_id, stats=stats)
+            self._mirror_write('delete', entry_id)
             return True
         except Exception as e:
             print(f"Error deleting entry from Firestore: {e}")
@@ -296,43 +993,460 @@ class FirebaseManager:
     
     def _delete_entry_local(self, entry_id):
         """Delete an entry from local storage"""
-        # Delete from memory
-        if hasattr(self, 'local_entries'):
-            self.local_entries = [entry for entry in self.local_entries if entry.get('id') != entry_id]
+        old = self._get_entry_local(entry_id)
+        stats = stats_delta(old, None) if old is not None else {}
+        
+        if self.local_store is not None:
+            try:
+                deleted = self.local_store.delete(entry_id)
+            except Exception as e:
+                print(f"Error deleting entry from local store: {e}")
+                return False
+            if deleted:
+                self.local_stats.apply(stats)
+                self._unindex_local([entry_id])
+                self._queue_local_write('delete', entry_id)
+            return deleted
         
-        # Delete from local file
         try:
-            local_file = 'local_entries.json'
-            if os.path.exists(local_file):
-                with open(local_file, 'r') as f:
-                    entries = json.load(f)
-                
-                entries = [entry for entry in entries if entry.get('id') != entry_id]
-                
-                with open(local_file, 'w') as f:
-                    json.dump(entries, f, default=str, indent=2)
-                    
+            if self.local_cache.remove(entry_id):
+                self.local_cache.flush()
+                self.local_stats.apply(stats)
+                self._unindex_local([entry_id])
+                self._queue_local_write('delete', entry_id)
                 return True
         except Exception as e:
             print(f"Error deleting entry from local file: {e}")
         
         return False
 
-# Create a singleton instance
-firebase = FirebaseManager()
+    def add_entries(self, entries):
+        """Add many diary entries, returning their IDs in order"""
+        entries = [compress_entry(entry_data, COMPRESS_CONTENT) for entry_data in entries]
+        with self._connect_lock:
+            if not self.is_available:
+                return self._add_entries_local(entries)
+            
+        if not self.db:
+            print("Firebase not initialized")
+            return []
+        
+        entry_ids = []
+        try:
+            collection = self.collection('entries')
+            for chunk in _chunks(entries, FIRESTORE_BATCH_SIZE // WRITES_PER_ENTRY):
+                batch = self.db.batch()
+                chunk_ids = []
+                deltas = []
+                for entry_data in chunk:
+                    if 'timestamp' not in entry_data:
+                        entry_data['timestamp'] = datetime.now()
+                    add_date_fields(entry_data)
+                    add_tag_fields(entry_data)
+                    entry_id = collection.document().id
+                    self._write_document('set', entry_id, entry_data, batch)
+                    deltas.append(stats_delta(None, entry_data))
+                    chunk_ids.append(entry_id)
+                self._write_stats(combine_deltas(deltas), batch)
+                self._commit_stats_batch(batch)
+                for entry_id, entry_data in zip(chunk_ids, chunk):
+                    self._mirror_write('set', entry_id, entry_data)
+                entry_ids.extend(chunk_ids)
+            return entry_ids
+        except Exception as e:
+            print(f"Error adding entries to Firestore: {e}")
+            # Fallback to local storage for whatever was not committed
+            return entry_ids + self._add_entries_local(entries[len(entry_ids):])
+    
+    def _add_entries_local(self, entries):
+        """Store many entries locally with a single write"""
+        for entry_data in entries:
+            add_date_fields(entry_data)
+            add_tag_fields(entry_data)
+        
+        if self.local_store is not None:
+            try:
+                entry_ids = self.local_store.add_many(entries)
+            except Exception as e:
+                print(f"Error saving to local store: {e}")
+                return []
+            self.local_stats.apply(combine_deltas(stats_delta(None, entry_data) for entry_data in entries))
+            self._index_local(zip(entry_ids, entries))
+            for entry_id, entry_data in zip(entry_ids, entries):
+                self._queue_local_write('set', entry_id, entry_data)
+            return entry_ids
+        
+        entry_ids = []
+        try:
+            for entry_data in entries:
+                entry_data['id'] = str(uuid.uuid4())
+                self.local_cache.put(entry_data)
+                entry_ids.append(entry_data['id'])
+            self.local_cache.flush()
+            self.local_stats.apply(combine_deltas(stats_delta(None, entry_data) for entry_data in entries))
+            self._index_local(zip(entry_ids, entries))
+            for entry_id, entry_data in zip(entry_ids, entries):
+                self._queue_local_write('set', entry_id, entry_data)
+        except Exception as e:
+            print(f"Error saving to local file: {e}")
+        
+        return entry_ids
+    
+    def update_entries(self, updates):
+        """Apply several updates given as {entry_id: data}; returns how many were applied"""
+        updates = [(entry_id, compress_entry(dict(data, **update_date_fields(data), **tag_fields(data)),
+                                             COMPRESS_CONTENT, replace=True))
+                   for entry_id, data in updates.items()]
+        with self._connect_lock:
+            if not self.is_available:
+                return self._update_entries_local(updates)
+            
+        if not self.db:
+            print("Firebase not initialized")
+            return 0
+        
+        done = 0
+        try:
+            for chunk in _chunks(updates, FIRESTORE_BATCH_SIZE // WRITES_PER_ENTRY):
+                batch = self.db.batch()
+                deltas = []
+                # Old versions for the stats deltas, read in one batch
+                stats_ids = [entry_id for entry_id, data in chunk if affects_stats(data)]
+                old_entries = self._read_stored_entries(stats_ids, STATS_FIELDS) if stats_ids else {}
+                for entry_id, data in chunk:
+                    self._write_document('update', entry_id, data, batch)
+                    deltas.append(self._update_stats_delta(entry_id, data, old_entries.get))
+                self._write_stats(combine_deltas(deltas), batch)
+                self._commit_stats_batch(batch)
+                for entry_id, data in chunk:
+                    self._mirror_write('update', entry_id, data)
+                done += len(chunk)
+            return done
+        except Exception as e:
+            print(f"Error updating entries in Firestore: {e}")
+            # Fallback to local storage
+            return done + self._update_entries_local(updates[done:])
+    
+    def _update_entries_local(self, updates):
+        """Update many entries locally with a single write"""
+        stats = combine_deltas(self._update_stats_delta(entry_id, data, self._get_entry_local)
+                               for entry_id, data in updates)
+        
+        if self.local_store is not None:
+            try:
+                count = self.local_store.update_many(updates)
+            except Exception as e:
+                print(f"Error updating entries in local store: {e}")
+                return 0
+            self.local_stats.apply(stats)
+            self._index_local_updates(updates)
+            for entry_id, data in updates:
+                self._queue_local_write('update', entry_id, data)
+            return count
+        
+        count = 0
+        try:
+            for entry_id, data in updates:
+                if self.local_cache.update(entry_id, data):
+                    count += 1
+            if count:
+                self.local_cache.flush()
+                self.local_stats.apply(stats)
+                self._index_local_updates(updates)
+                for entry_id, data in updates:
+                    self._queue_local_write('update', entry_id, data)
+        except Exception as e:
+            print(f"Error updating entries in local file: {e}")
+        
+        return count
+    
+    def delete_entries(self, entry_ids):
+        """Delete several entries; returns how many were deleted"""
+        entry_ids = list(entry_ids)
+        with self._connect_lock:
+            if not self.is_available:
+                return self._delete_entries_local(entry_ids)
+            
+        if not self.db:
+            print("Firebase not initialized")
+            return 0
+        
+        done = 0
+        try:
+            # Each delete also writes a tombstone and a stats update
+            for chunk in _chunks(entry_ids, FIRESTORE_BATCH_SIZE // WRITES_PER_ENTRY):
+                batch = self.db.batch()
+                # Old versions for the stats deltas, read in one batch
+                old_entries = self._read_stored_entries(chunk, STATS_FIELDS)
+                deltas = [stats_delta(old, None) for old in old_entries.values()]
+                for entry_id in chunk:
+                    self._write_document('delete', entry_id, batch=batch)
+                self._write_stats(combine_deltas(deltas), batch)
+                self._commit_stats_batch(batch)
+                for entry_id in chunk:
+                    self._mirror_write('delete', entry_id)
+                done += len(chunk)
+            return done
+        except Exception as e:
+            print(f"Error deleting entries from Firestore: {e}")
+            # Fallback to local storage
+            return done + self._delete_entries_local(entry_ids[done:])
+    
+    def _delete_entries_local(self, entry_ids):
+        """Delete many entries locally with a single write"""
+        old_entries = [self._get_entry_local(entry_id) for entry_id in entry_ids]
+        stats = combine_deltas(stats_delta(old, None) for old in old_entries if old is not None)
+        
+        if self.local_store is not None:
+            try:
+                count = self.local_store.delete_many(entry_ids)
+            except Exception as e:
+                print(f"Error deleting entries from local store: {e}")
+                return 0
+            self.local_stats.apply(stats)
+            self._unindex_local(entry_ids)
+            for entry_id in entry_ids:
+                self._queue_local_write('delete', entry_id)
+            return count
+        
+        count = 0
+        try:
+            for entry_id in entry_ids:
+                if self.local_cache.remove(entry_id):
+                    count += 1
+            if count:
+                self.local_cache.flush()
+                self.local_stats.apply(stats)
+                self._unindex_local(entry_ids)
+                for entry_id in entry_ids:
+                    self._queue_local_write('delete', entry_id)
+        except Exception as e:
+            print(f"Error deleting entries from local file: {e}")
+        
+        return count
+    
+    def search_entries(self, query, limit=20, filters=None, fields=None):
+        """Return entries matching a free-text query, best BM25 match first
+        
+        Searches title, content, keywords and tags through the inverted index,
+        so only entries containing a query term are looked at. Each result
+        carries its relevance as `score`. `filters` and `fields` work as in
+        get_entries.
+        """
+        index = self._search_index()
+        # With filters some hits may be rejected, so rank every match
+        ranked = index.search(query, limit=None if filters else limit)
+        
+        # Only read what the results and filters need; content is only
+        # decompressed when it was asked for
+        fetch_fields = None
+        if fields:
+            fetch_fields = list(dict.fromkeys(list(fields) + (FILTER_FIELDS if filters else [])
+                                              + (['content_z'] if 'content' in fields else [])))
+        
+        results = []
+        for chunk in _chunks(ranked, limit or SEARCH_FETCH_SIZE):
+            entries = self._get_stored_entries_by_id([entry_id for entry_id, _ in chunk], fetch_fields)
+            for entry_id, score in chunk:
+                entry = entries.get(entry_id)
+                if entry is None or (filters and not matches_filters(entry, filters)):
+                    continue
+                if not fields or 'content' in fields:
+                    entry = decompress_entry(entry)
+                entry = project_entry(entry, fields) if fields else dict(entry)
+                entry['score'] = score
+                results.append(entry)
+                if limit and len(results) >= limit:
+                    return results
+        return results
+    
+    def _search_index(self):
+        """The search index for the active storage, built on first use"""
+        if self.is_available and self.remote_index is not None:
+            if not self.remote_index.exists():
+                try:
+                    docs = self._call(lambda: list(self.collection('entries').select(SEARCH_FIELDS).stream()))
+                    self.remote_index.rebuild([dict(doc.to_dict(), id=doc.id) for doc in docs])
+                except Exception as e:
+                    print(f"Error building search index from Firestore: {e}")
+            return self.remote_index
+        
+        if not self.local_index.exists():
+            entries, _ = self._get_entries_local(limit=None, order_by=None, fields=SEARCH_FIELDS)
+            self.local_index.rebuild(entries)
+        return self.local_index
+    
+    def get_chart_frame(self, filters=None, since_ordinal=None):
+        """DataFrame of the chartable fields of every matching entry, oldest first
+        
+        Built with vectorized operations on the columnar snapshot, so charts
+        can cover the whole archive without reading entries. `filters` works
+        as in get_entries.
+        """
+        return self._chart_columns().frame(filters, since_ordinal)
+    
+    def _chart_columns(self):
+        """The columnar snapshot for the active storage, built on first use"""
+        if self.is_available and self.remote_columns is not None:
+            if not self.remote_columns.exists():
+                try:
+                    if self.mirror is not None and self.mirror.ready.is_set():
+                        entries = self.mirror.cache.get_all()
+                    else:
+                        docs = self._call(lambda: list(self.collection('entries').select(COLUMN_FIELDS).stream()))
+                        entries = [dict(doc.to_dict(), id=doc.id) for doc in docs]
+                    self.remote_columns.rebuild(entries)
+                except Exception as e:
+                    print(f"Error building columnar snapshot from Firestore: {e}")
+            return self.remote_columns
+        
+        if not self.local_columns.exists():
+            entries, _ = self._get_entries_local(limit=None, order_by=None, fields=COLUMN_FIELDS)
+            self.local_columns.rebuild(entries)
+        return self.local_columns
+    
+    def get_stats(self, since_ordinal=None):
+        """Summarize the running statistics, optionally from a day ordinal onwards
+        
+        Reads the per-month stats documents (or the local sidecar) instead
+        of the entries, so the cost does not grow with the archive.
+        """
+        if not self.is_available:
+            return summarize(self._get_local_stats_days(), since_ordinal)
+            
+        if not self.db:
+            print("Firebase not initialized")
+            return summarize({}, since_ordinal)
+        
+        try:
+            days = {}
+            built = False
+            for doc in self._call(lambda: list(self.collection('entry_stats').stream())):
+                days.update(doc.to_dict().get('days', {}))
+                built = built or (doc.id == STATS_BUILT_MARKER
+                                  and doc.to_dict().get('version', 1) >= STATS_VERSION)
+            if not built:
+                # Increments made so far only cover the writes since the
+                # upgrade; count the entries written before it, without
+                # holding up the page
+                self._start_stats_rebuild()
+                if self.mirror is None or not self.mirror.ready.is_set():
+                    return dict(summarize({}, since_ordinal), building=True)
+                days = build_days(self.mirror.cache.get_all())
+            if self.outbox is not None:
+                # Include writes that are still waiting in the outbox
+                for delta in self.outbox.pending_stats():
+                    apply_delta(days, delta)
+            return summarize(days, since_ordinal)
+        except Exception as e:
+            print(f"Error getting statistics from Firestore: {e}")
+            # Fallback to local storage
+            return summarize(self._get_local_stats_days(), since_ordinal)
+    
+    def _get_local_stats_days(self):
+        """Per-day statistics for local storage, built on first use"""
+        if not self.local_stats.exists():
+            entries, _ = self._get_entries_local(limit=None, order_by=None, fields=STATS_FIELDS)
+            self.local_stats.rebuild(entries)
+        return self.local_stats.get_days()
+    
+    def _start_stats_rebuild(self):
+        """Start rebuilding the Firestore statistics in the background, unless already running"""
+        with self._stats_rebuild_lock:
+            if self._stats_rebuild is not None and self._stats_rebuild.is_alive():
+                return
+            self._stats_rebuild = threading.Thread(target=self._rebuild_stats_in_background,
+                                                   name='stats-rebuild', daemon=True)
+            self._stats_rebuild.start()
+    
+    def _rebuild_stats_in_background(self):
+        try:
+            self.rebuild_stats()
+        except Exception as e:
+            print(f"Error rebuilding statistics in Firestore: {e}")
+    
+    def rebuild_stats(self):
+        """Recompute the statistics from every entry; returns the per-day buckets"""
+        if not self.is_available or not self.db:
+            entries, _ = self._get_entries_local(limit=None, order_by=None, fields=STATS_FIELDS)
+            self.local_stats.rebuild(entries)
+            return self.local_stats.get_days()
+        
+        stats = self.collection('entry_stats')
+        
+        # Entries and stats documents are read and written in one
+        # transaction, so an entry write with its increments lands either
+        # before the recount (and is counted) or after it (and is added on
+        # top), never in between. One document per month keeps the writes
+        # far below a transaction's limits.
+        @firestore.transactional
+        def rebuild(transaction):
+            docs = transaction.get(self.collection('entries').select(STATS_FIELDS))
+            days = build_days(doc.to_dict() for doc in docs)
+            months = {}
+            for day, bucket in days.items():
+                months.setdefault(month_of_day(day), {})[day] = bucket
+            stale = [doc.id for doc in transaction.get(stats.select([]))
+                     if doc.id not in months and doc.id != STATS_BUILT_MARKER]
+            for month, month_days in months.items():
+                transaction.set(stats.document(month), {'days': month_days})
+            for month in stale:
+                transaction.delete(stats.document(month))
+            transaction.set(stats.document(STATS_BUILT_MARKER),
+                            {'built_at': firestore.SERVER_TIMESTAMP, 'version': STATS_VERSION})
+            return days
+        
+        # Whole documents are replaced, so a retried commit is harmless
+        return self._call(lambda: rebuild(self.db.transaction()))
+
+# User whose partition the helper functions below read and write. Streamlit
+# runs each session's script in its own thread, so this is per session.
+_current_user = contextvars.ContextVar('time_capsule_user', default=None)
+
+def set_current_user(user_id):
+    """Make a partition id from partition_id() the current user"""
+    _current_user.set(_check_partition_id(user_id))
+
+def get_manager(user_id=None):
+    """Manager for a user's partition (the current user by default)"""
+    return FirebaseManager(user_id if user_id is not None else _current_user.get())
 
 # Helper functions for easy access
 def add_entry(entry_data):
-    return firebase.add_entry(entry_data)
+    return get_manager().add_entry(entry_data)
 
-def get_entries(limit=50, order_by='timestamp', descending=True):
-    return firebase.get_entries(limit, order_by, descending)
+def get_entries(limit=50, order_by='timestamp', descending=True, cursor=None, filters=None, fields=None):
+    return get_manager().get_entries(limit, order_by, descending, cursor, filters, fields)
+
+def get_entries_page(limit=50, order_by='timestamp', descending=True, cursor=None, filters=None, fields=None):
+    return get_manager().get_entries_page(limit, order_by, descending, cursor, filters, fields)
 
 def get_entry(entry_id):
-    return firebase.get_entry(entry_id)
+    return get_manager().get_entry(entry_id)
 
 def update_entry(entry_id, data):
-    return firebase.update_entry(entry_id, data)
+    return get_manager().update_entry(entry_id, data)
 
 def delete_entry(entry_id):
-    return firebase.delete_entry(entry_id)
+    return get_manager().delete_entry(entry_id)
+
+def add_entries(entries):
+    return get_manager().add_entries(entries)
+
+def update_entries(updates):
+    return get_manager().update_entries(updates)
+
+def delete_entries(entry_ids):
+    return get_manager().delete_entries(entry_ids)
+
+def search_entries(query, limit=20, filters=None, fields=None):
+    return get_manager().search_entries(query, limit, filters, fields)
+
+def get_chart_frame(filters=None, since_ordinal=None):
+    return get_manager().get_chart_frame(filters, since_ordinal)
+
+def get_stats(since_ordinal=None):
+    return get_manager().get_stats(since_ordinal)
+
+def rebuild_stats():
+    return get_manager().rebuild_stats()
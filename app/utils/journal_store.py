@@ -0,0 +1,334 @@
+import os
+import json
+import uuid
+import threading
+
+
+class JournalStore:
+    """Append-only local entry store.
+
+    Every write is appended to a JSONL log as a put/update/delete record
+    instead of rewriting the whole entries file. The log is periodically
+    folded into the snapshot file (same format as local_entries.json) by a
+    background compaction thread.
+    """
+
+    def __init__(self, snapshot_path='local_entries.json', log_path='local_entries.jsonl',
+                 compact_threshold=1000):
+        self.snapshot_path = snapshot_path
+        self.log_path = log_path
+        self.old_log_path = log_path + '.old'
+        self.compact_threshold = compact_threshold
+
+        self._entries = {}
+        self._log_records = 0
+
+        # Lock order: _lock -> _commit_cond. Only the thread holding the
+        # _flushing flag touches the log file.
+        self._lock = threading.RLock()
+        self._commit_cond = threading.Condition()
+        self._pending = []
+        self._next_seq = 0
+        self._durable_seq = 0
+        # seq -> error for groups whose write failed, until their writer sees it
+        self._failed = {}
+        self._flushing = False
+        self._compacting = False
+
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Loading and replay
+    # ------------------------------------------------------------------
+    def _load(self):
+        """Load the snapshot and replay any log records on top of it"""
+        try:
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, 'r') as f:
+                    for entry in json.load(f):
+                        if entry.get('id'):
+                            self._entries[entry['id']] = entry
+        except Exception as e:
+            print(f"Error reading journal snapshot: {e}")
+
+        # A leftover .old log means a compaction was interrupted; replaying it
+        # again is safe because puts, merges and deletes are idempotent.
+        self._replay(self.old_log_path)
+        self._log_records = self._replay(self.log_path)
+
+    def _replay(self, path):
+        """Apply every complete record in a log file, dropping a torn tail"""
+        if not os.path.exists(path):
+            return 0
+
+        count = 0
+        valid_length = 0
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b'\n'):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            self._apply(record)
+            valid_length += len(line)
+            count += 1
+
+        if valid_length < len(data):
+            # The process died mid-append; cut the partial record so the next
+            # append starts on a clean line.
+            print(f"Discarding {len(data) - valid_length} bytes of incomplete journal data in {path}")
+            with open(path, 'r+b') as f:
+                f.truncate(valid_length)
+
+        return count
+
+    def _apply(self, record):
+        """Apply a single log record to the in-memory state"""
+        op = record.get('op')
+        entry_id = record.get('id')
+        if op == 'put':
+            self._entries[entry_id] = record['data']
+        elif op == 'update':
+            if entry_id in self._entries:
+                self._entries[entry_id].update(record['data'])
+        elif op == 'delete':
+            self._entries.pop(entry_id, None)
+
+    # ------------------------------------------------------------------
+    # Group commit
+    # ------------------------------------------------------------------
+    def _append(self, record):
+        """Apply a record in memory and block until it is durable on disk"""
+        self._append_many([record])
+
+    def _append_many(self, records):
+        """Apply records in memory and commit them to disk as one group
+
+        Raises the I/O error if the group could not be written; the records
+        are then undone in memory too.
+        """
+        if not records:
+            return
+        lines = [json.dumps(record, default=str) + '\n' for record in records]
+        with self._lock:
+            for line in lines:
+                self._apply(json.loads(line))
+            with self._commit_cond:
+                self._next_seq += 1
+                seq = self._next_seq
+                self._pending.extend(lines)
+            self._log_records += len(lines)
+            needs_compaction = self._log_records >= self.compact_threshold
+
+        self._wait_durable(seq)
+
+        if needs_compaction:
+            self.compact(background=True)
+
+    def _wait_durable(self, seq):
+        """Wait for a record to be fsynced, flushing the group if no one else is"""
+        with self._commit_cond:
+            while self._durable_seq < seq:
+                if self._flushing:
+                    self._commit_cond.wait()
+                    continue
+
+                # Become the leader: write everything queued so far with a
+                # single write + fsync, then wake the followers.
+                self._flushing = True
+                batch = self._pending
+                first_seq = self._durable_seq + 1
+                batch_seq = self._next_seq
+                self._pending = []
+                self._commit_cond.release()
+                error = None
+                try:
+                    self._write_lines(batch)
+                except Exception as e:
+                    error = e
+                    self._restore()
+                finally:
+                    self._commit_cond.acquire()
+                    self._flushing = False
+                    self._durable_seq = batch_seq
+                    self._fail(first_seq, batch_seq, error)
+                    self._commit_cond.notify_all()
+
+            error = self._failed.pop(seq, None)
+        if error is not None:
+            raise error
+
+    def _fail(self, first_seq, last_seq, error):
+        """Hand a failed write's error to the writers of its groups (with _commit_cond held)"""
+        if error is not None:
+            for seq in range(first_seq, last_seq + 1):
+                self._failed[seq] = error
+
+    def _write_lines(self, lines):
+        """Append lines to the log file and fsync, leaving the file as it was on failure"""
+        if not lines:
+            return
+        size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        try:
+            with open(self.log_path, 'a') as f:
+                f.write(''.join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception as e:
+            print(f"Error writing to journal: {e}")
+            try:
+                # Drop whatever part of the group made it to disk
+                with open(self.log_path, 'r+b') as f:
+                    f.truncate(size)
+            except Exception:
+                pass
+            raise
+
+    def _restore(self):
+        """Reload the entries from disk after a failed write, keeping the records still queued"""
+        with self._lock:
+            self._entries = {}
+            self._load()
+            with self._commit_cond:
+                pending = list(self._pending)
+            for line in pending:
+                self._apply(json.loads(line))
+            self._log_records += len(pending)
+
+    # ------------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------------
+    def compact(self, background=False):
+        """Fold the log into the snapshot file"""
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+
+        if background:
+            threading.Thread(target=self._compact, daemon=True).start()
+        else:
+            self._compact()
+
+    def _compact(self):
+        batch_seq = None
+        error = None
+        try:
+            # Take the flush slot so no group commit writes while the log rotates
+            with self._commit_cond:
+                while self._flushing:
+                    self._commit_cond.wait()
+                self._flushing = True
+
+            try:
+                with self._lock:
+                    with self._commit_cond:
+                        batch = self._pending
+                        first_seq = self._durable_seq + 1
+                        batch_seq = self._next_seq
+                        self._pending = []
+                    entries = [dict(entry) for entry in self._entries.values()]
+                    self._log_records = 0
+
+                # Drain queued records, then rotate the log so new writes go to
+                # a fresh file while the snapshot is being written
+                try:
+                    self._write_lines(batch)
+                except Exception as e:
+                    error = e
+                    self._restore()
+                    raise
+                if os.path.exists(self.log_path):
+                    if os.path.exists(self.old_log_path):
+                        with open(self.log_path, 'rb') as src, open(self.old_log_path, 'ab') as dst:
+                            dst.write(src.read())
+                        os.remove(self.log_path)
+                    else:
+                        os.replace(self.log_path, self.old_log_path)
+            finally:
+                with self._commit_cond:
+                    self._flushing = False
+                    if batch_seq is not None:
+                        self._durable_seq = batch_seq
+                        self._fail(first_seq, batch_seq, error)
+                    self._commit_cond.notify_all()
+
+            tmp_path = self.snapshot_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(entries, f, default=str)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+
+            if os.path.exists(self.old_log_path):
+                os.remove(self.old_log_path)
+        except Exception as e:
+            print(f"Error compacting journal: {e}")
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    # ------------------------------------------------------------------
+    # Entry operations
+    # ------------------------------------------------------------------
+    def add(self, entry_data):
+        """Append a new entry and return its ID"""
+        entry_id = str(uuid.uuid4())
+        entry_data['id'] = entry_id
+        self._append({'op': 'put', 'id': entry_id, 'data': entry_data})
+        return entry_id
+
+    def get_all(self):
+        """Return all entries in insertion order"""
+        with self._lock:
+            return list(self._entries.values())
+
+    def get(self, entry_id):
+        """Return a single entry or None"""
+        with self._lock:
+            return self._entries.get(entry_id)
+
+    def update(self, entry_id, data):
+        """Append an update record for an existing entry"""
+        with self._lock:
+            if entry_id not in self._entries:
+                return False
+        self._append({'op': 'update', 'id': entry_id, 'data': data})
+        return True
+
+    def delete(self, entry_id):
+        """Append a delete tombstone for an entry"""
+        with self._lock:
+            if entry_id not in self._entries:
+                return False
+        self._append({'op': 'delete', 'id': entry_id})
+        return True
+
+    def add_many(self, entries):
+        """Append several new entries in a single group commit"""
+        records = []
+        for entry_data in entries:
+            entry_data['id'] = str(uuid.uuid4())
+            records.append({'op': 'put', 'id': entry_data['id'], 'data': entry_data})
+        self._append_many(records)
+        return [record['id'] for record in records]
+
+    def update_many(self, updates):
+        """Append update records for several entries; returns how many existed"""
+        with self._lock:
+            records = [{'op': 'update', 'id': entry_id, 'data': data}
+                       for entry_id, data in updates if entry_id in self._entries]
+        self._append_many(records)
+        return len(records)
+
+    def delete_many(self, entry_ids):
+        """Append delete tombstones for several entries; returns how many existed"""
+        with self._lock:
+            records = [{'op': 'delete', 'id': entry_id}
+                       for entry_id in dict.fromkeys(entry_ids) if entry_id in self._entries]
+        self._append_many(records)
+        return len(records)
@@ -0,0 +1,219 @@
+import os
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+
+from app.utils.entry_cache import EntryCache
+
+# Allowance for clock skew between this host and Firestore server timestamps
+CLOCK_SKEW = timedelta(minutes=1)
+
+
+class FirestoreMirror:
+    """Local read-through mirror of a Firestore collection.
+
+    The mirror is kept current by an on_snapshot listener. When listeners are
+    unavailable it polls for documents whose `updated_at` is newer than the
+    last one seen, plus delete tombstones. Entries are held in an EntryCache
+    (id dict + timestamp index) and persisted to disk so a restart only has
+    to fetch the changes made since the last sync. `on_change(doc_id, entry)`
+    is called after every change (entry is None for deletes). `pending_ids()`
+    returns the ids with writes not yet sent to Firestore, which a full sync
+    must not drop.
+    """
+
+    def __init__(self, collection, tombstones=None, path='firestore_mirror.json',
+                 poll_interval=30, persist_interval=5, on_change=None, pending_ids=None):
+        self.collection = collection
+        self.tombstones = tombstones
+        self.path = path
+        self.meta_path = path + '.meta'
+        self.poll_interval = poll_interval
+        self.persist_interval = persist_interval
+        self.on_change = on_change
+        self.pending_ids = pending_ids
+
+        self.cache = EntryCache(path)
+        self.ready = threading.Event()
+        self._lock = threading.Lock()
+        self._watermark = None
+        self._dirty = False
+        self._listener = None
+        self._listener_synced = False
+        # When each document was last written locally (see apply_document)
+        self._local_writes = {}
+        self._stop = threading.Event()
+
+        self._load_meta()
+
+        # A persisted mirror can serve reads right away while it catches up
+        if self._watermark is not None:
+            self.ready.set()
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def _load_meta(self):
+        """Restore the sync watermark saved with the persisted mirror"""
+        try:
+            if os.path.exists(self.meta_path) and os.path.exists(self.path):
+                with open(self.meta_path, 'r') as f:
+                    watermark = json.load(f).get('watermark')
+                if watermark:
+                    self._watermark = datetime.fromisoformat(watermark)
+        except Exception as e:
+            print(f"Error reading mirror metadata, doing a full sync: {e}")
+            self._watermark = None
+
+    def persist(self):
+        """Write the mirror and its watermark to disk if they changed"""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            watermark = self._watermark
+        try:
+            self.cache.flush()
+            with open(self.meta_path, 'w') as f:
+                json.dump({'watermark': watermark.isoformat() if watermark else None}, f)
+        except Exception as e:
+            print(f"Error persisting Firestore mirror: {e}")
+
+    # ------------------------------------------------------------------
+    # Applying changes
+    # ------------------------------------------------------------------
+    def apply_document(self, doc_id, data, local=False):
+        """Insert or replace a document in the mirror
+        
+        Pass `local=True` for a write made here that Firestore may not have yet.
+        """
+        if local:
+            self._note_local_write(doc_id)
+        entry = dict(data)
+        entry['id'] = doc_id
+        self.cache.put(entry)
+        updated_at = data.get('updated_at')
+        with self._lock:
+            self._dirty = True
+            if isinstance(updated_at, datetime) and (self._watermark is None or updated_at > self._watermark):
+                self._watermark = updated_at
+        self._notify(doc_id, entry)
+
+    def apply_update(self, doc_id, data):
+        """Merge a local write into the mirror for read-your-writes"""
+        self._note_local_write(doc_id)
+        if self.cache.update(doc_id, data):
+            with self._lock:
+                self._dirty = True
+            self._notify(doc_id, self.cache.get(doc_id))
+
+    def _note_local_write(self, doc_id):
+        with self._lock:
+            self._local_writes[doc_id] = datetime.now(timezone.utc)
+
+    def remove_document(self, doc_id):
+        with self._lock:
+            self._local_writes.pop(doc_id, None)
+        if self.cache.remove(doc_id):
+            self._notify(doc_id, None)
+        with self._lock:
+            self._dirty = True
+
+    def _notify(self, doc_id, entry):
+        if self.on_change is None:
+            return
+        try:
+            self.on_change(doc_id, entry)
+        except Exception as e:
+            print(f"Error handling mirror change for entry {doc_id}: {e}")
+
+    # ------------------------------------------------------------------
+    # Sync
+    # ------------------------------------------------------------------
+    def start(self):
+        """Start syncing with a listener, falling back to delta polling"""
+        try:
+            self._listener = self.collection.on_snapshot(self._on_snapshot)
+        except Exception as e:
+            print(f"Firestore listener unavailable, polling for changes instead: {e}")
+            self._listener = None
+
+        if self._listener is None:
+            threading.Thread(target=self._poll_loop, name='firestore-mirror-poll', daemon=True).start()
+        threading.Thread(target=self._persist_loop, name='firestore-mirror-persist', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.unsubscribe()
+        self.persist()
+
+    def _on_snapshot(self, docs, changes, read_time):
+        try:
+            for change in changes:
+                if change.type.name == 'REMOVED':
+                    self.remove_document(change.document.id)
+                else:
+                    self.apply_document(change.document.id, change.document.to_dict())
+            if not self._listener_synced:
+                # The first snapshot holds the whole collection; anything
+                # else in a persisted mirror was deleted while offline
+                self._remove_missing({doc.id for doc in docs}, read_time)
+                self._listener_synced = True
+            self.ready.set()
+        except Exception as e:
+            print(f"Error applying Firestore changes to mirror: {e}")
+
+    def sync_once(self):
+        """Fetch documents changed since the watermark (or everything on first sync)"""
+        since = self._watermark
+        full_sync = since is None
+        started_at = datetime.now(timezone.utc) - CLOCK_SKEW
+        query = self.collection
+        if not full_sync:
+            query = query.where('updated_at', '>', since).order_by('updated_at')
+
+        seen_ids = set()
+        for doc in query.stream():
+            self.apply_document(doc.id, doc.to_dict())
+            seen_ids.add(doc.id)
+
+        if full_sync:
+            self._remove_missing(seen_ids, started_at)
+            # Documents written before updated_at existed carry no watermark
+            with self._lock:
+                if self._watermark is None:
+                    self._watermark = started_at
+                    self._dirty = True
+        elif self.tombstones is not None:
+            for doc in self.tombstones.where('deleted_at', '>', since).stream():
+                self.remove_document(doc.id)
+
+        self.ready.set()
+
+    def _remove_missing(self, seen_ids, read_time):
+        """Drop cached entries that a full sync did not return (deleted while offline)
+        
+        Entries with writes still waiting to be sent, or written here after
+        `read_time`, are kept: Firestore did not have them yet.
+        """
+        keep = set(self.pending_ids()) if self.pending_ids is not None else set()
+        with self._lock:
+            self._local_writes = {doc_id: written_at for doc_id, written_at in self._local_writes.items()
+                                  if written_at > read_time - CLOCK_SKEW}
+            keep.update(self._local_writes)
+        for entry in self.cache.get_all():
+            if entry['id'] not in seen_ids and entry['id'] not in keep:
+                self.remove_document(entry['id'])
+
+    def _poll_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.sync_once()
+            except Exception as e:
+                print(f"Error syncing Firestore mirror: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def _persist_loop(self):
+        while not self._stop.wait(self.persist_interval):
+            self.persist()
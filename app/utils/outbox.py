@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import uuid
+import threading
+from collections import deque
+from datetime import datetime
+
+
+def _encode(value):
+    """JSON default hook that keeps datetimes distinguishable from strings"""
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    return str(value)
+
+
+def _decode(obj):
+    if '__datetime__' in obj and len(obj) == 1:
+        return datetime.fromisoformat(obj['__datetime__'])
+    return obj
+
+
+class PermanentWriteError(Exception):
+    """Raised by a sender when a record can never be applied and should be dropped"""
+
+
+class WriteOutbox:
+    """Durable write-behind queue for Firestore writes.
+
+    Writes are appended (and fsynced) to an on-disk outbox and applied by a
+    background worker in order. Every record carries its final document ID,
+    so replaying a record after a crash or an outage is idempotent.
+    """
+
+    def __init__(self, path='firestore_outbox.jsonl', retry_delay=1.0, max_retry_delay=60.0):
+        self.path = path
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        self._records = deque()
+        self._next_seq = 0
+        self._cond = threading.Condition()
+        self._send = None
+        self._thread = None
+
+        self._load()
+
+    def _load(self):
+        """Read the outbox file and keep the records that were never acknowledged"""
+        if not os.path.exists(self.path):
+            return
+
+        records = {}
+        try:
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        item = json.loads(line, object_hook=_decode)
+                    except ValueError:
+                        # Torn write from a crash; everything before it is intact
+                        break
+                    if 'ack' in item:
+                        records.pop(item['ack'], None)
+                    else:
+                        records[item['seq']] = item
+                        self._next_seq = max(self._next_seq, item['seq'])
+        except Exception as e:
+            print(f"Error reading write outbox: {e}")
+
+        self._records.extend(records[seq] for seq in sorted(records))
+        self._rewrite()
+        if self._records:
+            print(f"{len(self._records)} pending writes will be replayed to Firestore")
+
+    def _append_line(self, item):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(item, default=_encode) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite(self):
+        """Rewrite the outbox with only the pending records"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for record in self._records:
+                f.write(json.dumps(record, default=_encode) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+    def enqueue(self, op, entry_id, data=None, stats=None, defer_stats=False, local=False):
+        """Durably queue a 'set', 'update' or 'delete' for a document
+
+        `stats` is an optional statistics delta to apply together with the
+        write; `defer_stats` marks a record whose delta the sender has to
+        work out itself. Such records get a unique `write_id`, which lets the
+        sender apply the delta only once however often the record is replayed.
+        `local` marks a copy of a write already made in local storage (see
+        discard_local).
+        """
+        with self._cond:
+            self._next_seq += 1
+            record = {'seq': self._next_seq, 'op': op, 'id': entry_id, 'data': data}
+            if stats:
+                record['stats'] = stats
+            if defer_stats:
+                record['defer_stats'] = True
+            if local:
+                record['local'] = True
+            if stats or defer_stats:
+                record['write_id'] = uuid.uuid4().hex
+            self._append_line(record)
+            self._records.append(record)
+            self._cond.notify_all()
+
+    def discard_local(self):
+        """Drop the queued copies of local writes; returns how many were dropped
+
+        Only valid before start(), e.g. once it is clear Firestore will not
+        be used, as the local storage already holds these writes.
+        """
+        with self._cond:
+            kept = deque(record for record in self._records if not record.get('local'))
+            dropped = len(self._records) - len(kept)
+            if dropped:
+                self._records = kept
+                self._rewrite()
+        return dropped
+
+    def apply_pending(self, entry_id, entry):
+        """Return `entry` as it will look once the queued writes for it are applied
+
+        Returns None when the document does not exist or a queued write deletes it.
+        """
+        with self._cond:
+            records = [record for record in self._records if record['id'] == entry_id]
+        for record in records:
+            if record['op'] == 'set':
+                entry = dict(record['data'])
+            elif record['op'] == 'update' and entry is not None:
+                entry = dict(entry)
+                entry.update(record['data'])
+            elif record['op'] == 'delete':
+                entry = None
+        if records and entry is not None:
+            entry['id'] = entry_id
+        return entry
+
+    def pending_writes(self):
+        """Queued writes as (op, entry id, data) tuples, oldest first"""
+        with self._cond:
+            return [(record['op'], record['id'], record['data']) for record in self._records]
+
+    def pending_ids(self):
+        """Ids of the documents with queued writes"""
+        with self._cond:
+            return {record['id'] for record in self._records}
+
+    def pending_stats(self):
+        """Statistics deltas carried by the queued writes, oldest first"""
+        with self._cond:
+            return [record['stats'] for record in self._records if record.get('stats')]
+
+    def __len__(self):
+        with self._cond:
+            return len(self._records)
+
+    # ------------------------------------------------------------------
+    # Consumer side
+    # ------------------------------------------------------------------
+    def start(self, send):
+        """Start the worker thread; `send(record)` applies one record or raises"""
+        self._send = send
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='firestore-outbox', daemon=True)
+            self._thread.start()
+
+    def flush(self, timeout=None):
+        """Block until the outbox is empty; returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._records:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _run(self):
+        delay = self.retry_delay
+        while True:
+            with self._cond:
+                while not self._records:
+                    self._cond.wait()
+                record = self._records[0]
+
+            try:
+                self._send(record)
+            except PermanentWriteError as e:
+                print(f"Dropping queued {record['op']} for entry {record['id']}: {e}")
+            except Exception as e:
+                print(f"Error replaying queued write, retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+                continue
+
+            delay = self.retry_delay
+            with self._cond:
+                self._records.popleft()
+                try:
+                    if self._records:
+                        self._append_line({'ack': record['seq']})
+                    else:
+                        # Fully drained: start over with an empty file
+                        self._rewrite()
+                except Exception as e:
+                    print(f"Error acknowledging queued write: {e}")
+                self._cond.notify_all()
@@ -0,0 +1,119 @@
+import time
+import random
+import threading
+
+from google.api_core import exceptions as google_exceptions
+
+# Errors raised before Firestore applied the request, so any call may be retried
+UNAPPLIED_ERRORS = (
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.Aborted,
+    ConnectionError,
+)
+
+# Errors after which a write may or may not have been applied; retried too,
+# which is why every call passed to retry() must be safe to repeat
+AMBIGUOUS_ERRORS = (
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    TimeoutError,
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service that is known to be down"""
+
+
+def is_transient(error):
+    """Whether an error suggests the service is unreachable rather than the request being wrong"""
+    return isinstance(error, UNAPPLIED_ERRORS + AMBIGUOUS_ERRORS)
+
+
+def retry(fn, retries=2, base_delay=0.2, max_delay=2.0):
+    """Call fn(), retrying transient errors with exponential backoff and full jitter
+
+    fn must be idempotent: it is also retried when an earlier attempt may
+    have been applied.
+    """
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except UNAPPLIED_ERRORS + AMBIGUOUS_ERRORS:
+            if attempt >= retries:
+                raise
+            time.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+            attempt += 1
+
+
+class CircuitBreaker:
+    """Fails calls fast while a service is down and probes for its recovery.
+
+    After `failure_threshold` consecutive transient failures the circuit
+    opens: calls raise CircuitOpenError immediately, so callers fall back
+    without waiting on timeouts. A background thread then calls `probe()`
+    every `reset_timeout` seconds and closes the circuit once it succeeds.
+    Errors that are not transient (e.g. NotFound) mean the service answered
+    and do not count as failures.
+    """
+
+    def __init__(self, probe=None, failure_threshold=3, reset_timeout=30.0):
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._open = False
+        self._opened_at = None
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._open
+
+    def call(self, fn, retries=2):
+        """Call fn() with retries unless the circuit is open"""
+        if self.is_open:
+            raise CircuitOpenError("Firestore is unavailable; using local storage")
+        try:
+            result = retry(fn, retries=retries)
+        except Exception as e:
+            if is_transient(e):
+                self.record_failure(e)
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self._failures += 1
+            if self._open or self._failures < self.failure_threshold:
+                return
+            self._open = True
+            self._opened_at = time.monotonic()
+        print(f"Firestore looks unavailable, using local storage until it recovers: {error}")
+        threading.Thread(target=self._probe_until_closed, name='firestore-probe', daemon=True).start()
+
+    def _probe_until_closed(self):
+        while True:
+            time.sleep(self.reset_timeout)
+            try:
+                if self.probe is not None:
+                    self.probe()
+            except Exception as e:
+                if is_transient(e):
+                    continue
+            with self._lock:
+                self._open = False
+                self._failures = 0
+                downtime = time.monotonic() - self._opened_at
+            print(f"Firestore is reachable again after {downtime:.0f}s")
+            return
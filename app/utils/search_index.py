@@ -0,0 +1,261 @@
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter
+
+import numpy as np
+
+from app.utils.compression import decompress_entry
+
+# Entry fields that are indexed, with how much each occurrence of a term counts
+FIELD_WEIGHTS = {'title': 3, 'tags': 3, 'keywords': 2, 'content': 1}
+# Fields to read when building the index (content may be stored compressed)
+SEARCH_FIELDS = list(FIELD_WEIGHTS) + ['content_z']
+
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+# Number of terms whose postings are kept as NumPy arrays between queries
+TERM_CACHE_SIZE = 256
+
+STOP_WORDS = frozenset("""
+a an and are as at be but by for from had has have he her his i if in into is it its me my of on or our
+she so that the their them they this to was we were what when which who will with you your
+""".split())
+
+
+def tokenize(text):
+    """Lowercase word tokens of a string, without stop words"""
+    return [token for token in TOKEN_RE.findall(str(text).lower()) if token not in STOP_WORDS]
+
+
+def entry_terms(entry):
+    """Weighted term frequencies of an entry's indexed fields"""
+    entry = decompress_entry(entry)
+    terms = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        value = entry.get(field)
+        if not value:
+            continue
+        if isinstance(value, (list, tuple)):
+            value = ' '.join(str(item) for item in value)
+        for token in tokenize(value):
+            terms[token] += weight
+    return dict(terms)
+
+
+def affects_search(data):
+    """Whether an update touches any indexed field"""
+    return any(field in data for field in FIELD_WEIGHTS)
+
+
+class SearchIndex:
+    """Incrementally maintained inverted index with BM25 ranking.
+
+    Postings map each term to {entry id: weighted term frequency}, so a query
+    only visits the entries containing its terms. Every entry also gets a
+    fixed slot so a term's postings can be scored as NumPy arrays (cached for
+    recently queried terms) instead of one entry at a time. Changes are appended to a
+    JSONL log and folded into the snapshot file once the log outgrows the
+    index; the postings are rebuilt from the snapshot and log on load.
+    """
+
+    def __init__(self, path='search_index.json', compact_threshold=1000, k1=1.2, b=0.75):
+        self.path = path
+        self.log_path = path + 'l'
+        self.compact_threshold = compact_threshold
+        self.k1 = k1
+        self.b = b
+
+        self._lock = threading.RLock()
+        self._log_records = 0
+        self._reset()
+
+        self._load()
+
+    def _reset(self):
+        self._docs = {}
+        self._postings = {}
+        self._total_length = 0
+        self._slots = {}
+        self._slot_ids = []
+        self._slot_lengths = np.zeros(1024)
+        self._term_arrays = {}
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def exists(self):
+        """Whether the index has been built (it may still be empty)"""
+        return os.path.exists(self.path) or os.path.exists(self.log_path)
+
+    def _load(self):
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    for entry_id, terms in json.load(f).get('docs', {}).items():
+                        self._set_terms(entry_id, terms)
+        except Exception as e:
+            print(f"Error reading search index: {e}")
+
+        if not os.path.exists(self.log_path):
+            return
+        try:
+            with open(self.log_path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn write from a crash; everything before it is intact
+                        break
+                    self._set_terms(record['id'], record['terms'])
+                    self._log_records += 1
+        except Exception as e:
+            print(f"Error reading search index log: {e}")
+
+    def _append(self, records):
+        with open(self.log_path, 'a') as f:
+            for entry_id, terms in records:
+                f.write(json.dumps({'id': entry_id, 'terms': terms}) + '\n')
+        self._log_records += len(records)
+        # Compacting only once the log outgrows the index keeps the cost of
+        # rewriting the snapshot proportional to the writes that caused it
+        if self._log_records > max(self.compact_threshold, len(self._docs)):
+            self._compact()
+
+    def _compact(self):
+        """Write the whole index to the snapshot and start a new log"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'docs': self._docs}, f)
+        os.replace(tmp_path, self.path)
+        open(self.log_path, 'w').close()
+        self._log_records = 0
+
+    # ------------------------------------------------------------------
+    # Index maintenance
+    # ------------------------------------------------------------------
+    def _set_terms(self, entry_id, terms):
+        """Replace an entry's postings (None removes the entry)"""
+        old = self._docs.pop(entry_id, None)
+        if old is not None:
+            for term in old:
+                self._term_arrays.pop(term, None)
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(entry_id, None)
+                    if not postings:
+                        del self._postings[term]
+            slot = self._slots[entry_id]
+            self._total_length -= self._slot_lengths[slot]
+            self._slot_lengths[slot] = 0
+
+        if terms:
+            slot = self._slots.get(entry_id)
+            if slot is None:
+                slot = self._slots[entry_id] = len(self._slot_ids)
+                self._slot_ids.append(entry_id)
+                if slot >= len(self._slot_lengths):
+                    self._slot_lengths = np.concatenate([self._slot_lengths, np.zeros(len(self._slot_lengths))])
+            self._docs[entry_id] = terms
+            for term, tf in terms.items():
+                self._term_arrays.pop(term, None)
+                self._postings.setdefault(term, {})[entry_id] = tf
+            length = sum(terms.values())
+            self._slot_lengths[slot] = length
+            self._total_length += length
+
+    def _arrays_for(self, term):
+        """(slots, term frequencies) of a term's postings as NumPy arrays"""
+        arrays = self._term_arrays.pop(term, None)
+        if arrays is None:
+            postings = self._postings.get(term)
+            if not postings:
+                return None
+            slots = np.fromiter((self._slots[entry_id] for entry_id in postings), dtype=np.int64, count=len(postings))
+            tfs = np.fromiter(postings.values(), dtype=np.float64, count=len(postings))
+            arrays = (slots, tfs)
+            if len(self._term_arrays) >= TERM_CACHE_SIZE:
+                # Evict the least recently used term
+                del self._term_arrays[next(iter(self._term_arrays))]
+        self._term_arrays[term] = arrays
+        return arrays
+
+    def put_many(self, entries):
+        """Index or re-index (entry id, entry) pairs"""
+        records = []
+        with self._lock:
+            if not self.exists():
+                # Not built yet; rebuild() will pick this entry up
+                return
+            for entry_id, entry in entries:
+                terms = (entry_terms(entry) if entry is not None else None) or None
+                if self._docs.get(entry_id) == terms:
+                    continue
+                self._set_terms(entry_id, terms)
+                records.append((entry_id, terms))
+            if records:
+                try:
+                    self._append(records)
+                except Exception as e:
+                    print(f"Error saving search index: {e}")
+
+    def put(self, entry_id, entry):
+        self.put_many([(entry_id, entry)])
+
+    def remove_many(self, entry_ids):
+        self.put_many([(entry_id, None) for entry_id in entry_ids])
+
+    def remove(self, entry_id):
+        self.put_many([(entry_id, None)])
+
+    def rebuild(self, entries):
+        """Replace the index with one built from the given entries"""
+        with self._lock:
+            self._reset()
+            for entry in entries:
+                if entry.get('id'):
+                    self._set_terms(entry['id'], entry_terms(entry))
+            try:
+                self._compact()
+            except Exception as e:
+                print(f"Error saving search index: {e}")
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def search(self, query, limit=20):
+        """Return [(entry id, BM25 score)] for a query, best first
+
+        With limit=None every matching entry is returned.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            n_docs = len(self._docs)
+            if not terms or not n_docs:
+                return []
+            avg_length = self._total_length / n_docs
+            k1, b = self.k1, self.b
+
+            scores = np.zeros(len(self._slot_ids))
+            for term in terms:
+                arrays = self._arrays_for(term)
+                if arrays is None:
+                    continue
+                slots, tfs = arrays
+                df = len(slots)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                norm = k1 * (1 - b + b * self._slot_lengths[slots] / avg_length)
+                scores[slots] += idf * tfs * (k1 + 1) / (tfs + norm)
+
+            hits = np.flatnonzero(scores)
+            if limit and len(hits) > limit:
+                # Only the top `limit` scores need to be sorted
+                hits = hits[np.argpartition(scores[hits], -limit)[-limit:]]
+            hits = hits[np.argsort(-scores[hits], kind='stable')]
+            return [(self._slot_ids[slot], float(scores[slot])) for slot in hits]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._docs)
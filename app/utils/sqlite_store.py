@@ -0,0 +1,254 @@
+import os
+import json
+import uuid
+import sqlite3
+import threading
+
+
+# Columns that can be used directly in ORDER BY
+SORTABLE_COLUMNS = ('timestamp', 'date', 'mood')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id TEXT PRIMARY KEY,
+    date TEXT,
+    timestamp TEXT,
+    mood TEXT,
+    emotion TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_date ON entries(date);
+CREATE INDEX IF NOT EXISTS idx_entries_timestamp ON entries(timestamp);
+CREATE INDEX IF NOT EXISTS idx_entries_mood ON entries(mood, timestamp);
+CREATE INDEX IF NOT EXISTS idx_entries_emotion ON entries(emotion, timestamp);
+CREATE INDEX IF NOT EXISTS idx_entries_analysis_status ON entries(json_extract(data, '$.analysis_status'));
+
+CREATE TABLE IF NOT EXISTS entry_tags (
+    entry_id TEXT NOT NULL REFERENCES entries(id) ON DELETE CASCADE,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (entry_id, tag)
+);
+CREATE INDEX IF NOT EXISTS idx_entry_tags_tag ON entry_tags(tag);
+"""
+
+
+class SQLiteStore:
+    """Embedded SQLite entry store.
+
+    The full entry is kept as a JSON document, with the fields used for
+    sorting and filtering copied into indexed columns and tags normalized
+    into a join table.
+    """
+
+    def __init__(self, db_path='local_entries.db', import_path='local_entries.json'):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        with self._lock, self._conn:
+            # Rows written before emotions were stored lowercased
+            self._conn.execute("UPDATE entries SET emotion = lower(emotion) WHERE emotion <> lower(emotion)")
+
+        if import_path:
+            self._import_json(import_path)
+
+    def _import_json(self, path):
+        """Seed an empty database from the JSON entries file"""
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM entries LIMIT 1").fetchone():
+                return
+        if not os.path.exists(path):
+            return
+
+        try:
+            with open(path, 'r') as f:
+                entries = json.load(f)
+        except Exception as e:
+            print(f"Error importing local file into SQLite: {e}")
+            return
+
+        with self._lock, self._conn:
+            for entry in entries:
+                entry.setdefault('id', str(uuid.uuid4()))
+                self._upsert(entry)
+
+    # ------------------------------------------------------------------
+    # Row helpers
+    # ------------------------------------------------------------------
+    def _upsert(self, entry):
+        """Write an entry row and its tags (caller holds the lock and transaction)"""
+        data = json.loads(json.dumps(entry, default=str))
+        sentiment = data.get('sentiment') or {}
+        emotion = sentiment.get('emotion') if isinstance(sentiment, dict) else None
+        # Lowercased like the tags so filters match whatever case was saved
+        emotion = emotion.lower() if isinstance(emotion, str) else None
+        self._conn.execute(
+            "INSERT OR REPLACE INTO entries (id, date, timestamp, mood, emotion, data) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                data['id'],
+                data.get('date') or '',
+                data.get('timestamp') or '',
+                data.get('mood') or '',
+                emotion,
+                json.dumps(data),
+            )
+        )
+        self._conn.execute("DELETE FROM entry_tags WHERE entry_id = ?", (data['id'],))
+        tags = {tag.strip().lower() for tag in data.get('tags', []) if isinstance(tag, str) and tag.strip()}
+        self._conn.executemany(
+            "INSERT INTO entry_tags (entry_id, tag) VALUES (?, ?)",
+            [(data['id'], tag) for tag in tags]
+        )
+        return data
+
+    # ------------------------------------------------------------------
+    # Entry operations
+    # ------------------------------------------------------------------
+    def add(self, entry_data):
+        """Insert a new entry and return its ID"""
+        entry_id = str(uuid.uuid4())
+        entry_data['id'] = entry_id
+        with self._lock, self._conn:
+            self._upsert(entry_data)
+        return entry_id
+
+    def get_all(self):
+        """Return all entries"""
+        return self.query(limit=None, order_by=None)
+
+    def get(self, entry_id):
+        """Return a single entry or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM entries WHERE id = ?", (entry_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, entry_id, data):
+        """Merge fields into an existing entry"""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT data FROM entries WHERE id = ?", (entry_id,)).fetchone()
+            if not row:
+                return False
+            entry = json.loads(row[0])
+            entry.update(data)
+            entry['id'] = entry_id
+            self._upsert(entry)
+        return True
+
+    def delete(self, entry_id):
+        """Delete an entry and its tags"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM entries WHERE id = ?", (entry_id,))
+        return cursor.rowcount > 0
+
+    def add_many(self, entries):
+        """Insert several new entries in one transaction"""
+        entry_ids = []
+        with self._lock, self._conn:
+            for entry_data in entries:
+                entry_data['id'] = str(uuid.uuid4())
+                self._upsert(entry_data)
+                entry_ids.append(entry_data['id'])
+        return entry_ids
+
+    def update_many(self, updates):
+        """Merge fields into several entries in one transaction; returns how many existed"""
+        count = 0
+        with self._lock, self._conn:
+            for entry_id, data in updates:
+                row = self._conn.execute("SELECT data FROM entries WHERE id = ?", (entry_id,)).fetchone()
+                if not row:
+                    continue
+                entry = json.loads(row[0])
+                entry.update(data)
+                entry['id'] = entry_id
+                self._upsert(entry)
+                count += 1
+        return count
+
+    def delete_many(self, entry_ids):
+        """Delete several entries in one transaction; returns how many existed"""
+        with self._lock, self._conn:
+            cursor = self._conn.executemany("DELETE FROM entries WHERE id = ?", [(entry_id,) for entry_id in entry_ids])
+        return cursor.rowcount
+
+    def query(self, limit=50, order_by='timestamp', descending=True,
+              start_date=None, end_date=None, mood=None, emotion=None, tags=None, analysis_status=None,
+              after=None, fields=None):
+        """Return entries matching the filters using the indexes
+
+        Dates are ISO strings compared lexically against the `date` column.
+        `tags` matches entries that have any of the given tags. `after` is a
+        (sort key, id) keyset position to continue from. When `fields` is
+        given only those fields (plus id) are extracted from each document.
+        """
+        params = []
+        if fields:
+            # Build the projected document inside SQLite so large fields such
+            # as content are never decoded in Python
+            pairs = []
+            for field in fields:
+                pairs.append("?, json_extract(data, ?)")
+                params.extend([field, '$."' + field.replace('"', '') + '"'])
+            sql = f"SELECT json_object('id', id, {', '.join(pairs)}) FROM entries"
+        else:
+            sql = "SELECT data FROM entries"
+        clauses = []
+
+        if start_date:
+            clauses.append("date >= ?")
+            params.append(str(start_date))
+        if end_date:
+            clauses.append("date <= ?")
+            params.append(str(end_date))
+        if mood:
+            clauses.append("mood = ?")
+            params.append(mood)
+        if emotion:
+            clauses.append("emotion = ?")
+            params.append(emotion.lower())
+        if analysis_status:
+            # Same expression as idx_entries_analysis_status, so the index is used
+            clauses.append("json_extract(data, '$.analysis_status') = ?")
+            params.append(analysis_status)
+        if tags:
+            tags = [tag.strip().lower() for tag in tags if tag.strip()]
+            if tags:
+                placeholders = ", ".join("?" for _ in tags)
+                clauses.append(f"id IN (SELECT entry_id FROM entry_tags WHERE tag IN ({placeholders}))")
+                params.extend(tags)
+
+        if after and order_by:
+            if order_by not in SORTABLE_COLUMNS:
+                raise ValueError(f"Cannot order SQLite entries by {order_by!r}")
+            op = '<' if descending else '>'
+            clauses.append(f"({order_by}, id) {op} (?, ?)")
+            params.extend(after)
+
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+
+        if order_by:
+            if order_by not in SORTABLE_COLUMNS:
+                raise ValueError(f"Cannot order SQLite entries by {order_by!r}")
+            direction = 'DESC' if descending else 'ASC'
+            sql += f" ORDER BY {order_by} {direction}, id {direction}"
+
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        entries = [json.loads(row[0]) for row in rows]
+        if fields:
+            # Fields missing from a document come back as null; drop them
+            entries = [{key: value for key, value in entry.items() if value is not None} for entry in entries]
+        return entries
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,221 @@
+import os
+import json
+import threading
+from collections import Counter
+from datetime import date
+
+from app.utils.dates import entry_day_ordinal
+
+# Fields an entry contributes to the statistics; pass as `fields=` when
+# rebuilding so entry bodies are not read
+STATS_FIELDS = ['date', 'timestamp', 'day_ordinal', 'sentiment', 'tags', 'keywords']
+
+# Fields whose change alters an entry's contribution
+_STATS_INPUTS = {'date', 'timestamp', 'day_ordinal', 'sentiment', 'tags', 'keywords'}
+
+_COUNTERS = ('emotions', 'tags', 'keywords')
+
+
+def entry_contribution(entry):
+    """Return the (day key, bucket) an entry adds to the statistics
+
+    Statistics are kept per day (keyed by the day ordinal as a string) so
+    any time period can be summarized without reading entries.
+    """
+    sentiment = entry.get('sentiment') or {}
+    if not isinstance(sentiment, dict):
+        sentiment = {}
+    bucket = {
+        'count': 1,
+        'sentiment_sum': float(sentiment.get('score', 0.5)),
+        'emotions': {str(sentiment.get('emotion', 'neutral')).lower(): 1},
+        # Empty names are skipped; Firestore rejects them as map keys
+        'tags': dict(Counter(str(tag) for tag in entry.get('tags') or [] if str(tag).strip())),
+        'keywords': dict(Counter(str(keyword) for keyword in entry.get('keywords') or [] if str(keyword).strip())),
+    }
+    return str(entry_day_ordinal(entry)), bucket
+
+
+def _merge_bucket(target, bucket, sign=1):
+    target['count'] = target.get('count', 0) + sign * bucket.get('count', 0)
+    target['sentiment_sum'] = target.get('sentiment_sum', 0.0) + sign * bucket.get('sentiment_sum', 0.0)
+    for name in _COUNTERS:
+        counts = target.setdefault(name, {})
+        for key, value in bucket.get(name, {}).items():
+            counts[key] = counts.get(key, 0) + sign * value
+
+
+def _prune_bucket(bucket):
+    """Drop zero counters; returns False when nothing is left"""
+    for name in _COUNTERS:
+        bucket[name] = {key: value for key, value in bucket.get(name, {}).items() if value}
+    return bool(bucket.get('count') or abs(bucket.get('sentiment_sum', 0.0)) > 1e-9
+                or any(bucket[name] for name in _COUNTERS))
+
+
+def stats_delta(old_entry=None, new_entry=None):
+    """Per-day changes to apply when an entry goes from old_entry to new_entry
+
+    Pass None for old_entry on add and for new_entry on delete.
+    """
+    delta = {}
+    for entry, sign in ((old_entry, -1), (new_entry, 1)):
+        if entry is None:
+            continue
+        day, bucket = entry_contribution(entry)
+        _merge_bucket(delta.setdefault(day, {}), bucket, sign)
+    return {day: bucket for day, bucket in delta.items() if _prune_bucket(bucket)}
+
+
+def combine_deltas(deltas):
+    """Merge several stats_delta() results into one"""
+    combined = {}
+    for delta in deltas:
+        for day, bucket in delta.items():
+            _merge_bucket(combined.setdefault(day, {}), bucket)
+    return {day: bucket for day, bucket in combined.items() if _prune_bucket(bucket)}
+
+
+def affects_stats(data):
+    """Whether an update touches any field the statistics depend on"""
+    return bool(_STATS_INPUTS.intersection(data))
+
+
+def apply_delta(days, delta):
+    """Apply a stats_delta() to a {day: bucket} dict in place"""
+    for day, change in delta.items():
+        bucket = days.setdefault(day, {})
+        _merge_bucket(bucket, change)
+        _prune_bucket(bucket)
+        if bucket.get('count', 0) <= 0:
+            del days[day]
+    return days
+
+
+def build_days(entries):
+    """Compute the per-day buckets for a list of entries from scratch"""
+    days = {}
+    for entry in entries:
+        apply_delta(days, stats_delta(None, entry))
+    return days
+
+
+def month_of_day(day):
+    """Month key ("YYYY-MM") of a day key"""
+    return date.fromordinal(int(day)).strftime("%Y-%m")
+
+
+def summarize(days, since_ordinal=None):
+    """Aggregate per-day buckets into the numbers shown on the dashboard"""
+    count = 0
+    sentiment_sum = 0.0
+    counters = {name: Counter() for name in _COUNTERS}
+    months = Counter()
+    active_days = []
+
+    for day, bucket in days.items():
+        ordinal = int(day)
+        if since_ordinal is not None and ordinal < since_ordinal:
+            continue
+        day_count = bucket.get('count', 0)
+        if day_count <= 0:
+            continue
+        count += day_count
+        sentiment_sum += bucket.get('sentiment_sum', 0.0)
+        for name in _COUNTERS:
+            counters[name].update({key: value for key, value in bucket.get(name, {}).items() if value > 0})
+        months[month_of_day(day)] += day_count
+        active_days.append(ordinal)
+
+    # Consecutive days with entries, counting back from the most recent one
+    streak = 0
+    if active_days:
+        active_days.sort(reverse=True)
+        streak = 1
+        for i in range(1, len(active_days)):
+            if active_days[i-1] - active_days[i] == 1:
+                streak += 1
+            else:
+                break
+
+    return {
+        'count': count,
+        'avg_sentiment': sentiment_sum / count if count else 0,
+        'emotions': counters['emotions'],
+        'tags': counters['tags'],
+        'keywords': counters['keywords'],
+        'months': dict(months),
+        'streak': streak,
+    }
+
+
+class StatsSidecar:
+    """Running statistics for the local entries, kept next to the entries file
+
+    Changes are only applied once the statistics have been built from the
+    existing entries with rebuild(); before that, exists() is False.
+    """
+
+    def __init__(self, path='entry_stats.json'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._days = None
+        self._built = False
+
+    def exists(self):
+        """Whether the statistics have been built (they may still be empty)"""
+        with self._lock:
+            self._load()
+            return self._built
+
+    def _load(self):
+        if self._days is None:
+            self._days = {}
+            try:
+                if os.path.exists(self.path):
+                    with open(self.path, 'r') as f:
+                        data = json.load(f)
+                    # Files without the flag were started from the first
+                    # write after an upgrade and miss the older entries
+                    if data.get('built'):
+                        self._days = data.get('days', {})
+                        self._built = True
+            except Exception as e:
+                print(f"Error reading statistics file: {e}")
+        return self._days
+
+    def _save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'days': self._days, 'built': True}, f)
+        os.replace(tmp_path, self.path)
+
+    def get_days(self):
+        """Return a copy of the per-day buckets"""
+        with self._lock:
+            return json.loads(json.dumps(self._load()))
+
+    def apply(self, delta):
+        """Apply a stats_delta() and persist it"""
+        if not delta:
+            return
+        with self._lock:
+            self._load()
+            if not self._built:
+                # Not built yet; rebuild() will count this change
+                return
+            apply_delta(self._days, delta)
+            try:
+                self._save()
+            except Exception as e:
+                print(f"Error saving statistics file: {e}")
+
+    def rebuild(self, entries):
+        """Replace the statistics with ones computed from all entries"""
+        with self._lock:
+            self._days = build_days(entries)
+            self._built = True
+            try:
+                self._save()
+            except Exception as e:
+                print(f"Error saving statistics file: {e}")
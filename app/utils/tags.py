@@ -0,0 +1,33 @@
+# Lowercased copy of an entry's tags, stored with it so Firestore queries can
+# match tags case-insensitively (Firestore only compares array values exactly)
+TAG_FIELDS = ['tags_lower']
+
+
+def normalize_tags(tags):
+    """Stripped, lowercased tags without empty or repeated ones, in order"""
+    return list(dict.fromkeys(str(tag).strip().lower() for tag in tags or [] if str(tag).strip()))
+
+
+def clean_terms(values):
+    """Tags or keywords with surrounding whitespace and empty ones removed"""
+    return [str(value).strip() for value in values or [] if str(value).strip()]
+
+
+def tag_fields(data):
+    """Tag fields to store for an entry or update that sets `tags` or `keywords`
+
+    Empty tags and keywords (e.g. from "work,") are dropped.
+    """
+    fields = {}
+    if 'tags' in data:
+        fields['tags'] = clean_terms(data['tags'])
+        fields['tags_lower'] = normalize_tags(data['tags'])
+    if 'keywords' in data:
+        fields['keywords'] = clean_terms(data['keywords'])
+    return fields
+
+
+def add_tag_fields(entry):
+    """Add the tag fields to an entry in place"""
+    entry.update(tag_fields(entry))
+    return entry
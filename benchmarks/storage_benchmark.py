@@ -0,0 +1,227 @@
+"""Storage benchmark for FirebaseManager.
+
+Generates synthetic diary archives shaped like local_entries.json and
+measures throughput and p50/p99 latency of every FirebaseManager operation
+against each storage backend.
+
+Usage:
+    python benchmarks/storage_benchmark.py --sizes 1000 10000 --backends json journal sqlite
+
+To include Firestore, start the emulator (`firebase emulators:start --only firestore`)
+and set FIRESTORE_EMULATOR_HOST=localhost:8080 and GOOGLE_CLOUD_PROJECT=demo-time-capsule,
+then add `firestore` to --backends.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+# Make the app package importable when run from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils import firebase as firebase_module
+from app.utils.firebase import FirebaseManager, SUMMARY_FIELDS
+
+MOODS = ["😊 Happy", "😌 Content", "😐 Neutral", "😔 Sad", "😠 Angry", "😟 Anxious", "🤔 Thoughtful", "Other"]
+EMOTIONS = ["very positive", "positive", "neutral", "negative", "very negative"]
+TAGS = ["work", "family", "goals", "health", "travel", "friends", "reading", "reflection", "gratitude", "stress"]
+WORDS = (
+    "today felt calm busy quiet long bright heavy walk coffee friend family work report "
+    "meeting weekend morning evening rain sun park book music dinner plan idea progress "
+    "tired grateful anxious hopeful peaceful restless focus small win change habit"
+).split()
+
+
+def make_entry(rng, index, start_date):
+    """Build one synthetic entry with the same fields the app writes"""
+    day = start_date + timedelta(days=index // 2)
+    content = " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 400))).capitalize() + "."
+    score = rng.random()
+    return {
+        "title": " ".join(rng.choice(WORDS) for _ in range(3)).title(),
+        "content": content,
+        "date": day.date().isoformat(),
+        "timestamp": str(day + timedelta(seconds=rng.randint(0, 86399))),
+        "mood": rng.choice(MOODS),
+        "tags": rng.sample(TAGS, rng.randint(0, 3)),
+        "is_private": rng.random() < 0.8,
+        "summary": content[:200] + "...",
+        "sentiment": {"emotion": EMOTIONS[min(int((1 - score) * 5), 4)], "score": score},
+        "keywords": rng.sample(WORDS, 5),
+    }
+
+
+def make_archive(size, seed=0):
+    rng = random.Random(seed)
+    start_date = datetime(2015, 1, 1)
+    entries = []
+    for i in range(size):
+        entry = make_entry(rng, i, start_date)
+        entry["id"] = f"bench-{i:07d}"
+        entries.append(entry)
+    return entries
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def measure(name, func, repeat):
+    """Run func `repeat` times and return latency statistics in milliseconds"""
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    total = sum(samples) / 1000
+    return {
+        "operation": name,
+        "ops": repeat,
+        "ops_per_sec": repeat / total if total else float("inf"),
+        "p50_ms": statistics.median(samples),
+        "p99_ms": percentile(samples, 99),
+    }
+
+
+def open_manager(backend):
+    """Create a fresh FirebaseManager configured for one backend"""
+    FirebaseManager._instances.clear()
+    # Benchmark the local path even if credentials happen to be present
+    firebase_module.FIRESTORE = backend == "firestore"
+    if backend == "firestore":
+        manager = FirebaseManager()
+        if not manager.wait_ready():
+            raise RuntimeError("Firestore emulator is not reachable")
+        return manager
+
+    firebase_module.LOCAL_BACKEND = backend
+    return FirebaseManager()
+
+
+def seed(backend, archive):
+    """Load the archive into a backend and return a manager for it"""
+    if backend == "firestore":
+        manager = open_manager(backend)
+        manager.add_entries([dict(entry) for entry in archive])
+        if manager.outbox is not None:
+            manager.outbox.flush()
+        return manager
+
+    # Local backends start from a local_entries.json file, as the app does
+    with open(firebase_module.LOCAL_ENTRIES_FILE, "w") as f:
+        json.dump(archive, f, default=str)
+    return open_manager(backend)
+
+
+def run_backend(backend, size, repeat, seed_value):
+    archive = make_archive(size, seed_value)
+    rng = random.Random(seed_value + 1)
+    start_date = datetime(2030, 1, 1)
+    results = []
+
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            manager = seed(backend, archive)
+
+            ids = [entry["id"] for entry in manager.get_entries(limit=None, fields=["title"])]
+            new_ids = []
+            filters = {"start_date": "2016-01-01", "end_date": "2016-12-31", "mood": MOODS[0]}
+
+            results.append(measure("add_entry", lambda i: new_ids.append(
+                manager.add_entry(make_entry(rng, i, start_date))), repeat))
+            results.append(measure("get_entries(limit=100)", lambda i: manager.get_entries(limit=100), repeat))
+            results.append(measure("get_entries(summary fields)", lambda i: manager.get_entries(
+                limit=100, fields=SUMMARY_FIELDS), repeat))
+            results.append(measure("get_entries(filters)", lambda i: manager.get_entries(
+                limit=100, filters=filters), repeat))
+
+            cursors = [None]
+
+            def next_page(i):
+                _, cursor = manager.get_entries_page(limit=100, cursor=cursors[-1])
+                cursors.append(cursor)
+
+            results.append(measure("get_entries_page(walk)", next_page, min(repeat, max(1, size // 100))))
+            results.append(measure("get_entry", lambda i: manager.get_entry(rng.choice(ids)), repeat))
+            results.append(measure("update_entry", lambda i: manager.update_entry(
+                rng.choice(ids), {"title": f"updated {i}"}), repeat))
+            results.append(measure("delete_entry", lambda i: manager.delete_entry(new_ids[i]), repeat))
+
+            # The first call builds the search index, statistics and columns;
+            # measure the calls after it
+            manager.search_entries(WORDS[0], limit=20)
+            results.append(measure("search_entries", lambda i: manager.search_entries(
+                " ".join(rng.sample(WORDS, 2)), limit=20, fields=SUMMARY_FIELDS), repeat))
+            results.append(measure("search_entries(filters)", lambda i: manager.search_entries(
+                rng.choice(WORDS), limit=20, filters=filters, fields=SUMMARY_FIELDS), repeat))
+            manager.get_stats()
+            results.append(measure("get_stats", lambda i: manager.get_stats(), repeat))
+            manager.get_chart_frame()
+            results.append(measure("get_chart_frame", lambda i: manager.get_chart_frame(filters), repeat))
+
+            batch = [make_entry(rng, i, start_date) for i in range(min(size, 500))]
+            batch_ids = []
+            results.append(measure(f"add_entries({len(batch)})", lambda i: batch_ids.extend(manager.add_entries(
+                [dict(entry) for entry in batch])), 1))
+            results.append(measure(f"update_entries({len(batch_ids)})", lambda i: manager.update_entries(
+                {entry_id: {"title": f"batch {i}", "tags": rng.sample(TAGS, 2)} for entry_id in batch_ids}), 1))
+            results.append(measure(f"delete_entries({len(batch_ids)})", lambda i: manager.delete_entries(
+                batch_ids), 1))
+
+            if manager.outbox is not None:
+                manager.outbox.flush()
+            if hasattr(manager.local_store, "close"):
+                manager.local_store.close()
+        finally:
+            os.chdir(cwd)
+
+    for result in results:
+        result.update({"backend": backend, "size": size})
+    return results
+
+
+def print_table(results):
+    header = f"{'backend':<10} {'size':>8} {'operation':<30} {'ops/s':>10} {'p50 ms':>9} {'p99 ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['backend']:<10} {r['size']:>8} {r['operation']:<30} "
+              f"{r['ops_per_sec']:>10.1f} {r['p50_ms']:>9.3f} {r['p99_ms']:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FirebaseManager storage backends")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000],
+                        help="archive sizes to generate (e.g. 1000 10000 100000)")
+    parser.add_argument("--backends", nargs="+", default=["json", "journal", "sqlite"],
+                        choices=["json", "journal", "sqlite", "firestore"])
+    parser.add_argument("--repeat", type=int, default=100, help="operations per measurement")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for the synthetic archive")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        for backend in args.backends:
+            try:
+                results.extend(run_backend(backend, size, args.repeat, args.seed))
+            except Exception as e:
+                print(f"Skipping {backend} at {size} entries: {e}")
+
+    print_table(results)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Add the pre-parsed date and tag fields to entries saved before they existed.
+
+New entries get `day_ordinal`, `month_key`, `epoch` and `tags_lower` when
+they are saved; this tool upgrades existing ones in place without loading
+the whole archive into memory:
+
+  * the local JSON file is read one entry at a time and rewritten to a
+    temporary file that replaces the original only once it is complete
+  * journal/SQLite stores are upgraded through a single bulk update
+  * Firestore documents are read in pages ordered by document ID (only the
+    date and tag fields are fetched) and updated in batches of up to 500 writes
+
+Firestore tag filters match `tags_lower`, so entries saved before it existed
+only show up in tag-filtered timelines once they have been upgraded.
+
+Usage:
+    python scripts/migrate_entry_dates.py --json local_entries.json
+    python scripts/migrate_entry_dates.py --backend sqlite
+    python scripts/migrate_entry_dates.py --firestore
+    python scripts/migrate_entry_dates.py --backend sqlite --firestore --user alice
+
+Running it again is harmless; entries that already carry the fields are skipped.
+"""
+import os
+import sys
+import json
+import argparse
+
+# Make the app package importable when run from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.dates import DATE_FIELDS, date_fields
+from app.utils.tags import TAG_FIELDS, tag_fields
+
+READ_CHUNK_SIZE = 1 << 16
+PAGE_SIZE = 500
+
+
+# Fields read to decide whether an entry needs upgrading
+UPGRADE_INPUTS = ['date', 'timestamp', 'tags'] + DATE_FIELDS + TAG_FIELDS
+
+
+def upgrade_fields(entry):
+    """Fields missing from an entry that it should carry (empty if none)"""
+    fields = {}
+    if any(field not in entry for field in DATE_FIELDS):
+        fields.update(date_fields(entry))
+    if any(field not in entry for field in TAG_FIELDS):
+        fields.update(tag_fields(entry))
+    return fields
+
+
+def iter_json_array(f):
+    """Yield the items of a top-level JSON array without reading it all at once"""
+    decoder = json.JSONDecoder()
+    buffer = f.read(READ_CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError("expected a JSON array of entries")
+    buffer = buffer[1:]
+    eof = False
+
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except ValueError:
+            if eof:
+                raise
+            # The next item is split across chunks; read more and retry
+            chunk = f.read(READ_CHUNK_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def migrate_json(path):
+    """Rewrite a local entries file with the date fields added"""
+    tmp_path = path + '.migrating'
+    total = upgraded = 0
+    with open(path, 'r') as src, open(tmp_path, 'w') as dst:
+        dst.write('[')
+        for entry in iter_json_array(src):
+            fields = upgrade_fields(entry)
+            if fields:
+                entry.update(fields)
+                upgraded += 1
+            dst.write(',\n' if total else '\n')
+            dst.write(json.dumps(entry, indent=2, default=str))
+            total += 1
+        dst.write('\n]')
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.replace(tmp_path, path)
+    print(f"{path}: upgraded {upgraded} of {total} entries")
+
+
+def migrate_local_store(backend, user=None):
+    """Upgrade a journal or SQLite store through FirebaseManager"""
+    from app.utils import firebase as firebase_module
+
+    firebase_module.LOCAL_BACKEND = backend
+    # Only the local store, even if credentials are present
+    firebase_module.FIRESTORE = False
+    firebase_module.FirebaseManager._instances.clear()
+    manager = firebase_module.FirebaseManager(firebase_module.partition_id(user))
+    if manager.local_store is None:
+        raise RuntimeError(f"could not open the {backend} store")
+
+    entries = manager.get_entries(limit=None, order_by=None, fields=UPGRADE_INPUTS)
+    updates = {entry['id']: upgrade_fields(entry) for entry in entries}
+    updates = {entry_id: fields for entry_id, fields in updates.items() if fields}
+    upgraded = manager.update_entries(updates) if updates else 0
+    print(f"{backend} store: upgraded {upgraded} of {len(entries)} entries")
+
+
+def migrate_firestore(user=None):
+    """Upgrade Firestore documents page by page"""
+    from firebase_admin import firestore
+    from app.utils.firebase import FirebaseManager, partition_id
+
+    manager = FirebaseManager(partition_id(user))
+    if not manager.wait_ready():
+        raise RuntimeError("Firestore is not available")
+
+    query = (manager.collection('entries')
+             .order_by(firestore.FieldPath.document_id())
+             .select(UPGRADE_INPUTS)
+             .limit(PAGE_SIZE))
+    last_doc = None
+    total = upgraded = 0
+
+    while True:
+        page = query.start_after(last_doc) if last_doc is not None else query
+        docs = list(page.stream())
+        if not docs:
+            break
+
+        updates = {}
+        for doc in docs:
+            fields = upgrade_fields(doc.to_dict())
+            if fields:
+                updates[doc.id] = fields
+        if updates:
+            upgraded += manager.update_entries(updates)
+        total += len(docs)
+        last_doc = docs[-1]
+        print(f"Firestore: scanned {total} documents, upgraded {upgraded}")
+
+    if manager.outbox is not None:
+        manager.outbox.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add pre-parsed date and tag fields to existing entries")
+    parser.add_argument("--json", dest="json_path", help="local entries file to rewrite in place")
+    parser.add_argument("--backend", choices=["journal", "sqlite"], help="local store to upgrade")
+    parser.add_argument("--firestore", action="store_true", help="upgrade the Firestore entries collection")
+    parser.add_argument("--user", help="upgrade this user's partition instead of the default one")
+    args = parser.parse_args()
+
+    if not (args.json_path or args.backend or args.firestore):
+        parser.error("choose at least one of --json, --backend or --firestore")
+
+    if args.json_path:
+        migrate_json(args.json_path)
+    if args.backend:
+        migrate_local_store(args.backend, args.user)
+    if args.firestore:
+        migrate_firestore(args.user)
+
+
+if __name__ == "__main__":
+    main()